@@ -0,0 +1,169 @@
+"""Локальный стенд для сравнения пропускной способности webhook и polling.
+
+Поднимает поддельный Bot API сервер и минимального бота, который отвечает
+на каждое сообщение. В режиме webhook синтетические апдейты отправляются
+POST-запросами в приложение из ``services.webhook``, в режиме polling бот
+забирает их через getUpdates у поддельного сервера. Замеряется время до
+ответа на последний апдейт.
+
+    python bench_webhook.py --mode webhook --updates 2000 --concurrency 50
+    python bench_webhook.py --mode polling --updates 2000
+"""
+import argparse
+import asyncio
+import secrets
+import time
+from aiohttp import ClientSession, web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from services.webhook import SECRET_HEADER, build_app
+
+HOST = "127.0.0.1"
+BOT_TOKEN = "42:BENCHMARK"
+
+
+def make_update(update_id: int) -> dict:
+    user_id = 1000 + update_id % 100
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+            "text": "ping",
+        },
+    }
+
+
+class FakeBotAPI:
+    """Поддельный Bot API: отдает апдейты через getUpdates и считает ответы"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.updates = [make_update(i) for i in range(1, total + 1)]
+        self.answered = 0
+        self.done = asyncio.Event()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        data = await request.post()
+        if method == "getme":
+            result = {"id": 42, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getupdates":
+            result = await self._get_updates(int(data.get("offset") or 0), int(data.get("limit") or 100))
+        elif method == "sendmessage":
+            self.answered += 1
+            if self.answered >= self.total:
+                self.done.set()
+            chat_id = int(data["chat_id"])
+            result = {
+                "message_id": self.answered,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": data.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, offset: int, limit: int) -> list:
+        batch = self.updates[max(offset - 1, 0):max(offset - 1, 0) + limit]
+        if not batch:
+            # Имитация long polling: держим запрос, пока бенчмарк не закончится
+            try:
+                await asyncio.wait_for(self.done.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+        return batch
+
+
+def build_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def pong(message: Message):
+        await message.answer("pong")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def start_site(app: web.Application, port: int = 0):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, port
+
+
+async def bench_webhook(api: FakeBotAPI, bot: Bot, concurrency: int) -> float:
+    dp = build_dispatcher()
+    secret = secrets.token_urlsafe(16)
+    runner, port = await start_site(build_app(dp, bot, secret_token=secret, path="/webhook"))
+    url = f"http://{HOST}:{port}/webhook"
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in api.updates:
+        queue.put_nowait(update)
+
+    async def worker(session: ClientSession):
+        while not queue.empty():
+            update = queue.get_nowait()
+            async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as response:
+                response.raise_for_status()
+
+    started = time.perf_counter()
+    try:
+        async with ClientSession() as session:
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        await api.done.wait()
+        return time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+
+async def bench_polling(api: FakeBotAPI, bot: Bot) -> float:
+    dp = build_dispatcher()
+    started = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=1, handle_signals=False))
+    try:
+        await api.done.wait()
+        return time.perf_counter() - started
+    finally:
+        await dp.stop_polling()
+        await polling
+        await bot.session.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--mode", choices=("webhook", "polling"), default="webhook")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="одновременных POST-запросов в режиме webhook")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.updates)
+    fake_app = web.Application()
+    fake_app.router.add_route("POST", "/bot{token}/{method}", api.handle)
+    api_runner, api_port = await start_site(fake_app)
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(
+        api=TelegramAPIServer.from_base(f"http://{HOST}:{api_port}")
+    ))
+    try:
+        if args.mode == "webhook":
+            elapsed = await bench_webhook(api, bot, args.concurrency)
+        else:
+            elapsed = await bench_polling(api, bot)
+    finally:
+        await api_runner.cleanup()
+    print(f"{args.mode}: {args.updates} updates in {elapsed:.2f}s "
+          f"({args.updates / elapsed:.0f} updates/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,22 @@
 import asyncio
 import logging
+from typing import Optional
 from aiogram import Bot, Dispatcher
 from config.settings import settings
 from services.database import Database
-from models import Base
+from services.api_client import SpoonacularAPI
+from services.translator import IngredientTranslator
+from services.recipe_pool import RecipePool
+from services.tracking import UserActivityTracker
+from services.stats import StatsCounter
+from services.sender import MessageSender
+from keyboards.inline import DIETS, POPULAR_INGREDIENTS
 from routers import router as main_router
-from middlewares.admin import AdminMiddleware, BanMiddleware, UserTrackingMiddleware
+from middlewares.admin import BanMiddleware, UserTrackingMiddleware
+from middlewares.throttling import ThrottlingMiddleware
+from services.webhook import run_webhook
+from services.kv import KeyValueStore, create_fsm_storage, create_store
+from services.warmer import CacheWarmer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,18 +27,69 @@ logging.basicConfig(
     ]
 )
 
-async def init_db():
-    db = Database()
-    async with db.engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def init_db(kv_store: Optional[KeyValueStore] = None):
+    db = Database(kv_store=kv_store)
+    if kv_store is not None:
+        # Несколько воркеров стартуют одновременно - миграции применяет один
+        async with kv_store.lock("migrations", timeout=120):
+            await db.create_tables()
+    else:
+        await db.create_tables()
+    await db.load_banned_users()
     return db
 
+async def on_shutdown(dispatcher: Dispatcher):
+    """Освобождает общие ресурсы при остановке бота"""
+    warmer = dispatcher['warmer']
+    if warmer is not None:
+        await warmer.close()
+    await dispatcher['recipe_pool'].close()
+    await dispatcher['user_activity'].close()
+    await dispatcher['stats_counter'].close()
+    api: SpoonacularAPI = dispatcher['api']
+    await api.close()
+    api.translator.close()
+    await dispatcher['db'].close()
+    # Закрывает и соединение FSM-хранилища: у RedisStorage тот же клиент
+    kv_store = dispatcher['kv_store']
+    if kv_store is not None:
+        await kv_store.close()
+
 async def main():
-    db = await init_db()
+    kv_store = create_store()
+    db = await init_db(kv_store)
+    translator = IngredientTranslator(db)
+    await translator.load()
+    api = SpoonacularAPI(api_key=settings.spoonacular_api_key, translator=translator,
+                         recipe_store=db, kv_store=kv_store)
+    await api.start()
+    recipe_pool = RecipePool(api)
+    await recipe_pool.load(DIETS)
+    # Кнопки клавиатур отвечают из кэша уже с первого нажатия
+    warmer = None
+    if settings.warm_enabled:
+        warmer = CacheWarmer(api, recipe_pool, POPULAR_INGREDIENTS, DIETS, kv_store=kv_store)
+        await warmer.start()
+    user_activity = UserActivityTracker(db)
+    await user_activity.start()
+    stats_counter = StatsCounter(db)
+    await stats_counter.start()
     bot = Bot(token=settings.bot_token)
-    dp = Dispatcher()
+    # FSM-состояния в общем хранилище, если бот запущен несколькими воркерами
+    dp = Dispatcher(storage=create_fsm_storage(kv_store))
     
+    # Один экземпляр БД на весь процесс - хендлеры получают его аргументом db
     dp['db'] = db
+    dp['kv_store'] = kv_store
+    # Общий клиент Spoonacular с постоянным пулом HTTP-соединений
+    dp['api'] = api
+    dp['recipe_pool'] = recipe_pool
+    dp['warmer'] = warmer
+    dp['user_activity'] = user_activity
+    dp['stats_counter'] = stats_counter
+    # Отправка пачек сообщений с учетом лимитов Telegram
+    dp['sender'] = MessageSender(bot)
+    dp.shutdown.register(on_shutdown)
     
     # Подключаем middleware в правильном порядке
     dp.message.middleware(UserTrackingMiddleware()) 
@@ -36,13 +98,18 @@ async def main():
     dp.message.middleware(BanMiddleware()) 
     dp.callback_query.middleware(BanMiddleware())
     
-    dp.message.middleware(AdminMiddleware()) 
-    dp.callback_query.middleware(AdminMiddleware())
+    # Один экземпляр на оба типа событий - общие лимиты пользователя
+    throttling = ThrottlingMiddleware(store=kv_store)
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
     
     dp.include_router(main_router)
     
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    if settings.bot_mode == "webhook":
+        await run_webhook(dp, bot)
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,12 +1,135 @@
+from typing import Any, FrozenSet
 from pydantic import BaseSettings, validator
 
 class Settings(BaseSettings):
     bot_token: str = ""
     spoonacular_api_key: str = ""
-    admin_ids: str = "872063132, 7445452111"
+    admin_ids: FrozenSet[int] = frozenset({872063132, 7445452111})
+
+    # Способ получения апдейтов: "polling" или "webhook"
+    bot_mode: str = "polling"
+    # Публичный адрес бота (https://example.com), к нему добавляется webhook_path
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    # Секрет для заголовка X-Telegram-Bot-Api-Secret-Token; пустой - выводится из токена бота
+    webhook_secret: str = ""
+
+    # Общее хранилище для нескольких воркеров (FSM, кэш API, лимиты, блокировки):
+    # redis://host:6379/0, "memory://" - замена в памяти процесса, пусто - без него
+    redis_url: str = ""
+    # Время жизни распределенной блокировки, если ее владелец упал
+    kv_lock_timeout: float = 30
+
+    # База данных
+    database_url: str = "sqlite+aiosqlite:///db.sqlite3"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 3600
+
+    # HTTP-клиент Spoonacular
+    api_connection_limit: int = 20
+    api_connection_limit_per_host: int = 10
+    api_keepalive_timeout: float = 30.0
+    api_dns_cache_ttl: int = 300
+    api_rate_limit: float = 1.0  # запросов в секунду
+    api_rate_burst: float = 5
+    api_max_retries: int = 3
+    api_backoff_base: float = 0.5
+    api_backoff_max: float = 10.0
+    api_breaker_threshold: int = 5
+    api_breaker_reset: float = 60.0
+    api_quota_cooldown: float = 3600.0
+
+    # Кэш ответов API
+    cache_dir: str = "cache"
+    cache_ttl: int = 3600  # мягкий TTL: дальше отдаем и обновляем в фоне
+    cache_hard_ttl: int = 6 * 3600  # после жесткого TTL ждем ответа API
+    cache_stale_ttl: int = 24 * 3600
+    cache_memory_entries: int = 256
+    cache_max_bytes: int = 50 * 1024 * 1024
+    cache_sweep_interval: int = 600
+    cache_compress: bool = False
+    # Детали рецептов (informationBulk) почти не меняются - кэшируются надолго
+    recipe_info_ttl: int = 14 * 24 * 3600
+    recipe_info_max_bytes: int = 20 * 1024 * 1024
+    # Дополнять результаты поиска деталями (время, диеты, ссылка) одним запросом
+    enrich_search_results: bool = True
+
+    # Пул случайных рецептов
+    recipe_pool_low: int = 5
+    recipe_pool_high: int = 30
+
+    # Прогрев кэша для кнопок клавиатур при запуске и по расписанию
+    warm_enabled: bool = True
+    # Чаще жесткого TTL кэша - популярные запросы не успевают устареть
+    warm_interval: int = 3 * 3600
+    # Сколько баллов квоты Spoonacular можно потратить за один прогрев
+    warm_quota_budget: float = 50
+    # Сколько ждать первого прогрева перед приемом апдейтов
+    warm_startup_timeout: float = 30
+
+    # Отложенная запись активности пользователей
+    user_flush_interval: float = 10.0
+    user_flush_max_pending: int = 500
+    user_activity_resolution: float = 60.0
+
+    # Счетчики статистики
+    stats_flush_interval: float = 30.0
+
+    # Ограничение частоты запросов (токенов в секунду / размер всплеска)
+    throttle_rate: float = 1.0
+    throttle_burst: float = 5
+    throttle_search_rate: float = 0.2
+    throttle_search_burst: float = 3
+    # Отметки в клавиатуре ингредиентов: только правят клавиатуру, API не вызывают
+    throttle_toggle_rate: float = 5.0
+    throttle_toggle_burst: float = 20
+    throttle_chat_rate: float = 3.0
+    throttle_chat_burst: float = 20
+    throttle_idle_ttl: float = 300.0
+
+    # Исходящие сообщения (лимиты Telegram)
+    send_global_rate: float = 30.0
+    send_chat_rate: float = 1.0
+    send_group_rate: float = 20 / 60
+    send_chat_burst: float = 5
+    send_max_retries: int = 3
+    # Результаты поиска одним сообщением вместо отдельного на каждый рецепт
+    collapse_search_results: bool = False
+
+    # Избранное
+    favorites_page_size: int = 10
     
+    @validator('bot_mode')
+    def check_bot_mode(cls, value: str) -> str:
+        value = value.lower()
+        if value not in ('polling', 'webhook'):
+            raise ValueError("bot_mode must be 'polling' or 'webhook'")
+        return value
+
+    @validator('admin_ids', pre=True)
+    def parse_admin_ids(cls, value: Any) -> FrozenSet[int]:
+        """Разбирает строку вида "1, 2, 3" в множество ID один раз при загрузке"""
+        if isinstance(value, str):
+            parts = [part.strip() for part in value.split(',') if part.strip()]
+            invalid = [part for part in parts if not part.isdigit()]
+            if invalid:
+                raise ValueError(f"invalid admin ids: {', '.join(invalid)}")
+            return frozenset(int(part) for part in parts)
+        return frozenset(value)
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
 
-settings = Settings()
\ No newline at end of file
+        @classmethod
+        def parse_env_var(cls, field_name: str, raw_val: str) -> Any:
+            # ADMIN_IDS задается списком через запятую, а не JSON
+            if field_name == 'admin_ids':
+                return raw_val
+            return cls.json_loads(raw_val)
+
+settings = Settings()
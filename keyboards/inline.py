@@ -2,11 +2,16 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import Optional
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+DIETS = {
+    "vegetarian": "Вегетарианское",
+    "vegan": "Веганское",
+    "none": "Без диеты",
+}
+
 def diet_keyboard():
     builder = InlineKeyboardBuilder()
-    builder.button(text="Вегетарианское", callback_data="diet_vegetarian")
-    builder.button(text="Веганское", callback_data="diet_vegan")
-    builder.button(text="Без диеты", callback_data="diet_none")
+    for diet, title in DIETS.items():
+        builder.button(text=title, callback_data=f"diet_{diet}")
     builder.button(text="🏠 В меню", callback_data="main_menu")
     builder.adjust(1)
     return builder.as_markup()
@@ -18,44 +23,79 @@ def get_recipe_keyboard(recipe_id: int):
     builder.adjust(1)  # Располагаем кнопки вертикально
     return builder.as_markup()
 
-def favorites_keyboard(has_recipes=False):
+def search_results_keyboard(recipes):
+    """Кнопки сохранения для нескольких рецептов в одном сообщении"""
+    builder = InlineKeyboardBuilder()
+    for i, recipe in enumerate(recipes, 1):
+        builder.button(text=f"⭐ {i}", callback_data=f"save_{recipe.id}")
+    builder.button(text="🏠 В меню", callback_data="main_menu")
+    builder.adjust(len(recipes) or 1, 1)
+    return builder.as_markup()
+
+def _add_page_buttons(builder: InlineKeyboardBuilder, prefix: str, page: int, pages: int,
+                      favorites_list) -> int:
+    """Добавляет кнопки листания. callback_data: {prefix}_{страница}_{n|p}_{id-курсор}"""
+    count = 0
+    if page > 1:
+        builder.button(text="⬅️", callback_data=f"{prefix}_{page - 1}_p_{favorites_list[0]['id']}")
+        count += 1
+    if page < pages:
+        builder.button(text="➡️", callback_data=f"{prefix}_{page + 1}_n_{favorites_list[-1]['id']}")
+        count += 1
+    return count
+
+def favorites_keyboard(has_recipes=False, favorites_list=(), page=1, pages=1):
     builder = InlineKeyboardBuilder()
     
+    nav = _add_page_buttons(builder, "favpage", page, pages, favorites_list) if has_recipes else 0
     if has_recipes:
         builder.button(text="🗑️ Удалить", callback_data="delete_favorites")
     
     builder.button(text="🏠 В меню", callback_data="main_menu")
-    builder.adjust(1)
+    builder.adjust(*([nav] if nav else []), 1)
     return builder.as_markup()
 
-def delete_favorites_keyboard(favorites_list):
+def delete_favorites_keyboard(favorites_list, start=1, page=1, pages=1):
     """Создает клавиатуру с номерами блюд для удаления"""
     builder = InlineKeyboardBuilder()
     
-    for i, favorite in enumerate(favorites_list, 1):
+    for i, favorite in enumerate(favorites_list, start):
         builder.button(text=f"🗑️ {i}", callback_data=f"delete_fav_{favorite['recipe_id']}")
     
+    # По 3 кнопки удаления в ряд
+    rows = [3] * (len(favorites_list) // 3)
+    if len(favorites_list) % 3:
+        rows.append(len(favorites_list) % 3)
+    nav = _add_page_buttons(builder, "delpage", page, pages, favorites_list)
+    if nav:
+        rows.append(nav)
     builder.button(text="🗑️ Удалить всё", callback_data="delete_all_favorites")
     builder.button(text="🔙 Назад", callback_data="favorites_back")
     builder.button(text="🏠 В меню", callback_data="main_menu")
-    builder.adjust(3, 1)  # По 3 кнопки удаления в ряд, остальные по одной
+    builder.adjust(*rows, 1)  # остальные по одной
     return builder.as_markup()
 
-def ingredients_keyboard():
+POPULAR_INGREDIENTS = [
+    "яйца", "молоко", "мука", 
+    "курица", "рис", "картофель",
+    "помидоры", "сыр", "лук"
+]
+
+def ingredients_keyboard(selected=()):
+    """Клавиатура выбора ингредиентов: нажатие отмечает или снимает отметку"""
     builder = InlineKeyboardBuilder()
     
-    popular_ingredients = [
-        "яйца", "молоко", "мука", 
-        "курица", "рис", "картофель",
-        "помидоры", "сыр", "лук"
-    ]
-    
-    for ingredient in popular_ingredients:
-        builder.button(text=ingredient.capitalize(), callback_data=f"ingredient_{ingredient}")
+    for ingredient in POPULAR_INGREDIENTS:
+        mark = "✅ " if ingredient in selected else ""
+        builder.button(text=f"{mark}{ingredient.capitalize()}", callback_data=f"ingredient_{ingredient}")
     
+    if selected:
+        builder.button(text=f"🔍 Найти ({len(selected)})", callback_data="ingredients_search")
     builder.button(text="⚙️ Свой вариант", callback_data="custom_ingredient")
     builder.button(text="🏠 В меню", callback_data="main_menu")
-    builder.adjust(3, 1)  # По 3 ингредиента в ряд, остальные кнопки по одной
+    # По 3 ингредиента в ряд, остальные кнопки по одной
+    full_rows, rest = divmod(len(POPULAR_INGREDIENTS), 3)
+    builder.adjust(*([3] * full_rows), *([rest] if rest else []), 1)
     return builder.as_markup()
 
 def confirm_keyboard(action: str):
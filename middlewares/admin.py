@@ -2,10 +2,15 @@ from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 from typing import Any, Awaitable, Callable, Dict
 from services.database import Database
+from services.tracking import UserActivityTracker
+from services.stats import StatsCounter
 from config.settings import settings
 
 class AdminMiddleware(BaseMiddleware):
-    """Middleware для проверки прав администратора"""
+    """Middleware для проверки прав администратора.
+
+    Подключается только к роутеру админ-команд (routers/admin.py).
+    """
     
     async def __call__(
         self,
@@ -13,15 +18,8 @@ class AdminMiddleware(BaseMiddleware):
         event: Message | CallbackQuery,
         data: Dict[str, Any]
     ) -> Any:
-        # Получаем ID пользователя
-        user_id = event.from_user.id
-        
-        # Проверяем является ли пользователь администратором
-        admin_ids = getattr(settings, 'admin_ids', [])
-        if isinstance(admin_ids, str):
-            admin_ids = [int(x.strip()) for x in admin_ids.split(',') if x.strip().isdigit()]
-        
-        data['is_admin'] = user_id in admin_ids
+        # admin_ids уже разобраны в frozenset при загрузке настроек
+        data['is_admin'] = event.from_user.id in settings.admin_ids
         
         return await handler(event, data)
 
@@ -41,6 +39,8 @@ class BanMiddleware(BaseMiddleware):
         user_id = event.from_user.id
         
         # Проверяем заблокирован ли пользователь
+        # Проверка по множеству в памяти или общему хранилищу воркеров -
+        # без запроса к БД на каждый апдейт
         if await db.is_user_banned(user_id):
             if isinstance(event, Message):
                 await event.answer("🚫 Вы заблокированы и не можете использовать бота.")
@@ -72,10 +72,19 @@ class UserTrackingMiddleware(BaseMiddleware):
             'first_name': user.first_name,
             'last_name': user.last_name
         }
-        await db.add_or_update_user(user_data)
+        tracker: UserActivityTracker = data.get('user_activity')
+        if tracker:
+            # Запись в БД произойдет пачкой в фоне
+            tracker.touch(user_data)
+        else:
+            await db.add_or_update_user(user_data)
         
         # Увеличиваем счетчик команд для сообщений
         if isinstance(event, Message):
-            await db.increment_stat('total_commands')
+            stats_counter: StatsCounter = data.get('stats_counter')
+            if stats_counter:
+                stats_counter.incr('total_commands')
+            else:
+                await db.increment_stat('total_commands')
         
         return await handler(event, data)
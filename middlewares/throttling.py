@@ -1,16 +1,70 @@
 from aiogram import BaseMiddleware
-from aiogram.types import Update
-from datetime import datetime, timedelta
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, CallbackQuery
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from config.settings import settings
+from services.rate_limit import RateLimiter, SharedRateLimiter
+
+THROTTLED_TEXT = "⏳ Слишком много запросов, подождите пару секунд"
+
 
 class ThrottlingMiddleware(BaseMiddleware):
-    def __init__(self, limit: float = 0.5):
-        self.limit = timedelta(seconds=limit)
-        self.last_update = datetime.now() - self.limit
+    """Ограничение частоты запросов по пользователю и по чату (token bucket).
+
+    Хендлер может задать отдельный лимит флагом ``throttling_key``
+    (например, ``flags={"throttling_key": "search"}`` для дорогого поиска).
+    При превышении лимита пользователь один раз получает предупреждение,
+    остальные апдейты до восстановления токенов отбрасываются молча.
+    С общим хранилищем ``store`` лимиты действуют на все процессы бота.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 chat_limit: Optional[Tuple[float, float]] = None,
+                 idle_ttl: Optional[float] = None, store=None):
+        idle_ttl = idle_ttl if idle_ttl is not None else settings.throttle_idle_ttl
+        limits = limits or {
+            "default": (settings.throttle_rate, settings.throttle_burst),
+            "search": (settings.throttle_search_rate, settings.throttle_search_burst),
+            "toggle": (settings.throttle_toggle_rate, settings.throttle_toggle_burst),
+        }
+        chat_rate, chat_burst = chat_limit or (settings.throttle_chat_rate, settings.throttle_chat_burst)
+        if store is not None:
+            self.user_limiters = {
+                key: SharedRateLimiter(store, key, rate, burst, idle_ttl)
+                for key, (rate, burst) in limits.items()
+            }
+            self.chat_limiter = SharedRateLimiter(store, "chat", chat_rate, chat_burst, idle_ttl)
+        else:
+            self.user_limiters = {
+                key: RateLimiter(rate, burst, idle_ttl) for key, (rate, burst) in limits.items()
+            }
+            self.chat_limiter = RateLimiter(chat_rate, chat_burst, idle_ttl)
         super().__init__()
 
-    async def __call__(self, handler, event: Update, data: dict):
-        now = datetime.now()
-        if now - self.last_update < self.limit:
-            return
-        self.last_update = now
-        return await handler(event, data)
\ No newline at end of file
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        key = get_flag(data, "throttling_key", default="default")
+        limiter = self.user_limiters.get(key) or self.user_limiters["default"]
+
+        allowed, notify = await limiter.hit((key, event.from_user.id))
+        if allowed:
+            chat = event.chat if isinstance(event, Message) else (
+                event.message.chat if event.message else None
+            )
+            # В личке лимит чата совпадает с лимитом пользователя
+            if chat is not None and chat.id != event.from_user.id:
+                allowed, notify = await self.chat_limiter.hit(chat.id)
+
+        if allowed:
+            return await handler(event, data)
+
+        if notify:
+            await event.answer(THROTTLED_TEXT)
+        elif isinstance(event, CallbackQuery):
+            # Без ответа на callback у кнопки висят "часики"
+            await event.answer()
+        return None
@@ -1,18 +1,36 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+class Recipe(Base):
+    """Рецепт, который бот показывал пользователям. Ключ - id рецепта в Spoonacular"""
+    __tablename__ = 'recipes'
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    image = Column(String)
+    source_url = Column(String)
+    ready_in_minutes = Column(Integer)
+    servings = Column(Integer)
+    diets = Column(String)  # Через запятую
+    ingredients = Column(String)  # Через ", "; вместе с title и diets индексируется в recipes_fts
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Favorite(Base):
     __tablename__ = 'favorites'
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
-    recipe_id = Column(Integer, nullable=False)
-    title = Column(String, nullable=False)
-    image = Column(String)  
-    source_url = Column(String) 
+    # Данные рецепта хранятся один раз в recipes
+    recipe_id = Column(Integer, ForeignKey('recipes.id'), nullable=False)
+
+    __table_args__ = (
+        # Один рецепт у пользователя хранится один раз; индекс также
+        # обслуживает выборки по user_id
+        Index('ix_favorites_user_recipe', 'user_id', 'recipe_id', unique=True),
+    )
 
 class User(Base):
     __tablename__ = 'users'
@@ -35,4 +53,25 @@ class BotStats(Base):
     random_recipe_requests = Column(Integer, default=0)
     ingredient_searches = Column(Integer, default=0)
     favorites_views = Column(Integer, default=0)
-    last_updated = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    last_updated = Column(DateTime, default=datetime.utcnow)
+
+class Translation(Base):
+    __tablename__ = 'translations'
+    
+    source = Column(String, primary_key=True)  # Ингредиент на русском
+    target = Column(String, nullable=False)  # Перевод на английский
+
+
+class StatBucket(Base):
+    """Значение счетчика за час или за день - для трендов в /stats"""
+    __tablename__ = 'stat_buckets'
+    
+    id = Column(Integer, primary_key=True)
+    period = Column(String, nullable=False)  # 'hour' или 'day'
+    bucket_start = Column(DateTime, nullable=False)
+    name = Column(String, nullable=False)
+    value = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_stat_buckets_period_start_name', 'period', 'bucket_start', 'name', unique=True),
+    )
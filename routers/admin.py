@@ -3,27 +3,52 @@ from aiogram.types import Message
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from services.database import Database
+from services.api_client import SpoonacularAPI
+from services.stats import StatsCounter
+from services.tracking import UserActivityTracker
 from states.admin import AdminStates
+from middlewares.admin import AdminMiddleware
 import logging
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# is_admin нужен только хендлерам этого роутера
+router.message.middleware(AdminMiddleware())
+router.callback_query.middleware(AdminMiddleware())
+
+def _fmt(value) -> str:
+    return "—" if value is None else f"{value:g}"
+
+def _trend(values: dict) -> str:
+    return f"{values['hour']} / {values['today']} / {values['yesterday']}"
+
 @router.message(Command("stats"))
-async def show_stats(message: Message, is_admin: bool = False):
+async def show_stats(message: Message, db: Database, api: SpoonacularAPI,
+                     stats_counter: StatsCounter, user_activity: UserActivityTracker,
+                     is_admin: bool = False):
     """Показывает статистику бота (только для админов)"""
     if not is_admin:
         await message.answer("🚫 Эта команда доступна только администраторам")
         return
         
     try:
-        db = Database()
+        # Сбрасываем накопленное в памяти, чтобы цифры были актуальными
+        await stats_counter.flush()
+        await user_activity.flush()
         stats = await db.get_bot_stats()
+        trends = await db.get_stat_trends()
         
         if not stats:
             await message.answer("📊 Статистика пока недоступна")
             return
             
+        cache_stats = api.cache.stats()
+        quota = api.quota.stats()
+        quota_lines = "".join(
+            f"  • {name}: {values['requests']} запр., {values['points']:.2f} баллов, ошибок {values['errors']}\n"
+            for name, values in quota['endpoints'].items()
+        )
         stats_text = (
             "📊 **Статистика бота**\n\n"
             f"👥 Всего пользователей: **{stats['total_users']}**\n"
@@ -32,7 +57,16 @@ async def show_stats(message: Message, is_admin: bool = False):
             f"📝 Всего команд: **{stats['total_commands']}**\n"
             f"🎲 Случайных рецептов: **{stats['random_recipe_requests']}**\n"
             f"🔍 Поисков по ингредиентам: **{stats['ingredient_searches']}**\n"
-            f"⭐ Просмотров избранного: **{stats['favorites_views']}**\n\n"
+            f"⭐ Просмотров избранного: **{stats['favorites_views']}**\n"
+            f"💾 Кэш API: попаданий **{cache_stats['hits']}**, промахов **{cache_stats['misses']}**\n"
+            f"🗂 Индекс ингредиентов: **{len(api.ingredient_index)}** рецептов, ответов без API **{api.index_hits}**\n"
+            f"🔑 Квота Spoonacular: использовано **{_fmt(quota['used'])}**, осталось **{_fmt(quota['left'])}**\n"
+            f"{quota_lines}\n"
+            "📈 **Динамика** (час / сегодня / вчера)\n"
+            f"📝 Команды: {_trend(trends['total_commands'])}\n"
+            f"🎲 Случайные рецепты: {_trend(trends['random_recipe_requests'])}\n"
+            f"🔍 Поиски: {_trend(trends['ingredient_searches'])}\n"
+            f"⭐ Избранное: {_trend(trends['favorites_views'])}\n\n"
             f"🕐 Обновлено: {stats['last_updated'].strftime('%d.%m.%Y %H:%M')}"
         )
         
@@ -57,7 +91,8 @@ async def start_ban(message: Message, state: FSMContext, is_admin: bool = False)
     await state.set_state(AdminStates.waiting_ban_user_id)
 
 @router.message(AdminStates.waiting_ban_user_id)
-async def process_ban_user_id(message: Message, state: FSMContext, is_admin: bool = False):
+async def process_ban_user_id(message: Message, state: FSMContext, db: Database,
+                              user_activity: UserActivityTracker, is_admin: bool = False):
     """Обрабатывает ID пользователя для блокировки"""
     if not is_admin:
         await message.answer("🚫 Эта команда доступна только администраторам")
@@ -67,8 +102,6 @@ async def process_ban_user_id(message: Message, state: FSMContext, is_admin: boo
     try:
         user_id = int(message.text.strip())
         
-        db = Database()
-        
         # Проверяем существует ли пользователь
         is_banned = await db.is_user_banned(user_id)
         if is_banned:
@@ -76,6 +109,9 @@ async def process_ban_user_id(message: Message, state: FSMContext, is_admin: boo
             await state.clear()
             return
         
+        # Пользователь может быть еще только в буфере активности
+        await user_activity.flush()
+
         # Блокируем пользователя
         success = await db.ban_user(user_id)
         
@@ -108,7 +144,7 @@ async def start_unban(message: Message, state: FSMContext, is_admin: bool = Fals
     await state.set_state(AdminStates.waiting_unban_user_id)
 
 @router.message(AdminStates.waiting_unban_user_id)
-async def process_unban_user_id(message: Message, state: FSMContext, is_admin: bool = False):
+async def process_unban_user_id(message: Message, state: FSMContext, db: Database, is_admin: bool = False):
     """Обрабатывает ID пользователя для разблокировки"""
     if not is_admin:
         await message.answer("🚫 Эта команда доступна только администраторам")
@@ -118,8 +154,6 @@ async def process_unban_user_id(message: Message, state: FSMContext, is_admin: b
     try:
         user_id = int(message.text.strip())
         
-        db = Database()
-        
         # Разблокируем пользователя
         success = await db.unban_user(user_id)
         
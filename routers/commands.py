@@ -11,6 +11,7 @@ async def send_welcome(message: Message):
         "🔍 Доступные команды:\n"
         "/find_by_ingredients - Поиск по ингредиентам\n"
         "/random - Случайный рецепт\n"
+        "/search - Поиск по сохраненному каталогу рецептов\n"
         "/favorites - Избранные рецепты\n"
         "/help - Помощь"
     )
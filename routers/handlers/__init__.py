@@ -2,10 +2,12 @@ from aiogram import Router
 from .find_by_ingredients import router as find_by_ingredients_router
 from .random_recipe import router as random_router
 from .favorites import router as favorites_router
+from .search import router as search_router
 
 router = Router()
 router.include_router(find_by_ingredients_router)
 router.include_router(random_router)
 router.include_router(favorites_router)
+router.include_router(search_router)
 
-__all__ = ['router', 'find_by_ingredients_router', 'favorites_router', 'random_router']
\ No newline at end of file
+__all__ = ['router', 'find_by_ingredients_router', 'favorites_router', 'random_router', 'search_router']
\ No newline at end of file
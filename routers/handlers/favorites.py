@@ -2,15 +2,33 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from services.database import Database
+from services.stats import StatsCounter
+from services.recipes import RecipeRecord
 from keyboards.inline import favorites_keyboard, delete_favorites_keyboard
+from config.settings import settings
 import logging
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-async def get_recipe_data_from_message(message_text: str) -> dict:
-    """Извлекает данные рецепта из текста сообщения с учетом вашего формата"""
-    lines = [line.strip() for line in message_text.split('\n') if line.strip()]
+async def get_recipe_data_from_message(message_text: str, recipe_id: int = None) -> dict:
+    """Извлекает данные рецепта из текста сообщения с учетом вашего формата.
+
+    Нужна только для сообщений, отправленных до появления таблицы recipes:
+    новые рецепты сохраняются в нее клиентом API при получении.
+
+    Если в сообщении несколько рецептов (результаты поиска одним
+    сообщением), берется блок, ссылка в котором оканчивается на recipe_id.
+    """
+    blocks = [block for block in message_text.split('\n\n') if '🍴' in block]
+    text = blocks[0] if blocks else message_text
+    if len(blocks) > 1 and recipe_id is not None:
+        for block in blocks:
+            if any('🔗' in line and line.rstrip().endswith(f"-{recipe_id}") for line in block.split('\n')):
+                text = block
+                break
+    
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
     
     data = {
         'title': '',
@@ -30,28 +48,48 @@ async def get_recipe_data_from_message(message_text: str) -> dict:
     return data
 
 @router.message(Command("favorites"))
-async def show_favorites_command(message: Message):
+async def show_favorites_command(message: Message, db: Database, stats_counter: StatsCounter):
     """Показывает список избранных рецептов по команде"""
     # Увеличиваем счетчик просмотров избранного
-    db = Database()
-    await db.increment_stat('favorites_views')
-    await show_favorites(message)
+    stats_counter.incr('favorites_views')
+    await show_favorites(message, db)
+
+def parse_page_callback(data: str) -> dict:
+    """Разбирает callback_data вида {prefix}_{страница}_{n|p}_{id-курсор}"""
+    _, page, direction, cursor = data.split("_")
+    if direction == "p":
+        return {'page': int(page), 'before_id': int(cursor)}
+    return {'page': int(page), 'after_id': int(cursor)}
+
+async def load_favorites_page(db: Database, user_id: int, page: int = 1,
+                              after_id: int = None, before_id: int = None):
+    """Возвращает (рецепты страницы, номер страницы, всего страниц)"""
+    page_size = settings.favorites_page_size
+    total = await db.count_favorites(user_id)
+    pages = max(1, (total + page_size - 1) // page_size)
+    favorites = await db.get_favorites_page(user_id, after_id=after_id, before_id=before_id, limit=page_size)
+    if not favorites and total:
+        # Страница опустела после удаления - начинаем с первой
+        page = 1
+        favorites = await db.get_favorites_page(user_id, limit=page_size)
+    return favorites, min(page, pages), pages
 
-async def show_favorites(message_or_callback):
-    """Показывает список избранных рецептов"""
+async def show_favorites(message_or_callback, db: Database, page: int = 1,
+                         after_id: int = None, before_id: int = None):
+    """Показывает страницу избранных рецептов"""
     try:
-        db = Database()
         user_id = message_or_callback.from_user.id
         
-        favorites = await db.get_favorites(user_id)
+        favorites, page, pages = await load_favorites_page(db, user_id, page, after_id, before_id)
         
         if not favorites:
             text = ("⭐ У вас пока нет избранных рецептов.\n"
                    "Чтобы добавить рецепт, нажмите кнопку 'Сохранить' при просмотре любого рецепта")
             keyboard = favorites_keyboard()
         else:
+            start = (page - 1) * settings.favorites_page_size + 1
             response = []
-            for i, recipe in enumerate(favorites[:10], 1):
+            for i, recipe in enumerate(favorites, start):
                 item = f"{i}. {recipe.get('title', 'Без названия')}"
                 if recipe.get('image'):
                     item += f"\n📷 {recipe['image']}"
@@ -59,8 +97,10 @@ async def show_favorites(message_or_callback):
                     item += f"\n🔗 {recipe['source_url']}"
                 response.append(item)
             
-                text = "⭐ Ваши избранные рецепты:\n\n" + "\n\n".join(response)
-                keyboard = favorites_keyboard(has_recipes=True)
+            text = "⭐ Ваши избранные рецепты:\n\n" + "\n\n".join(response)
+            if pages > 1:
+                text += f"\n\n📄 Страница {page} из {pages}"
+            keyboard = favorites_keyboard(has_recipes=True, favorites_list=favorites, page=page, pages=pages)
         
         # Проверяем тип объекта - Message или CallbackQuery
         if isinstance(message_or_callback, Message):
@@ -77,30 +117,32 @@ async def show_favorites(message_or_callback):
             await message_or_callback.message.edit_text(error_text)
 
 @router.callback_query(F.data.startswith("save_"))
-async def save_to_favorites(callback: CallbackQuery):
+async def save_to_favorites(callback: CallbackQuery, db: Database):
     try:
-        db = Database()
         user_id = callback.from_user.id
         recipe_id = int(callback.data.split("_")[1])
         
-        # Получаем данные из сообщения
-        recipe_data = await get_recipe_data_from_message(callback.message.text)
-        recipe_data['id'] = recipe_id
+        # Рецепт уже лежит в таблице recipes - достаточно одной вставки
+        if await db.add_favorite(user_id, recipe_id):
+            await callback.answer("✅ Рецепт добавлен в избранное", show_alert=True)
+            return
+        if await db.is_favorite(user_id, recipe_id):
+            await callback.answer("ℹ️ Рецепт уже в избранном", show_alert=True)
+            return
         
-        # Логирование для отладки
+        # Старое сообщение: рецепта нет в БД, берем данные из текста
+        recipe_data = await get_recipe_data_from_message(callback.message.text, recipe_id)
         logger.debug(f"Extracted recipe data: {recipe_data}")
-        
-        # Проверка обязательных полей
         if not recipe_data.get('title'):
             raise ValueError("Не удалось извлечь название рецепта")
-        if not recipe_data.get('id'):
-            raise ValueError("Отсутствует ID рецепта")
-            
-        # Сохраняем в базу
-        if await db.add_favorite(user_id, recipe_data):
-            await callback.answer("✅ Рецепт добавлен в избранное", show_alert=True)
-        else:
-            await callback.answer("ℹ️ Рецепт уже в избранном", show_alert=True)
+        await db.save_recipes([RecipeRecord(
+            id=recipe_id,
+            title=recipe_data['title'],
+            image=recipe_data['image'],
+            source_url=recipe_data['source_url']
+        )])
+        await db.add_favorite(user_id, recipe_id)
+        await callback.answer("✅ Рецепт добавлен в избранное", show_alert=True)
             
     except ValueError as e:
         logger.error(f"Ошибка данных: {str(e)}\nПолный текст сообщения: {callback.message.text}")
@@ -118,6 +160,7 @@ async def show_main_menu(callback: CallbackQuery):
         "🔍 Доступные команды:\n"
         "/find_by_ingredients - Поиск по ингредиентам\n"
         "/random - Случайный рецепт\n"
+        "/search - Поиск по сохраненному каталогу рецептов\n"
         "/favorites - Избранные рецепты\n"
         "/help - Помощь"
     )
@@ -125,42 +168,60 @@ async def show_main_menu(callback: CallbackQuery):
 
 # Обработчик кнопки удаления избранного
 @router.callback_query(F.data == "delete_favorites")
-async def delete_favorites_menu(callback: CallbackQuery):
+async def delete_favorites_menu(callback: CallbackQuery, db: Database):
     """Показывает меню удаления избранного"""
+    await show_delete_menu(callback, db)
+
+async def show_delete_menu(callback: CallbackQuery, db: Database, page: int = 1,
+                           after_id: int = None, before_id: int = None):
+    """Показывает страницу меню удаления"""
     try:
-        db = Database()
         user_id = callback.from_user.id
-        favorites = await db.get_favorites(user_id)
+        favorites, page, pages = await load_favorites_page(db, user_id, page, after_id, before_id)
         
         if not favorites:
             await callback.answer("У вас нет избранных рецептов для удаления", show_alert=True)
             return
             
+        start = (page - 1) * settings.favorites_page_size + 1
         text = "🗑️ Выберите рецепт для удаления:\n\n"
-        for i, recipe in enumerate(favorites[:10], 1):
+        for i, recipe in enumerate(favorites, start):
             text += f"{i}. {recipe.get('title', 'Без названия')}\n"
+        if pages > 1:
+            text += f"\n📄 Страница {page} из {pages}"
             
         await callback.message.edit_text(
             text,
-            reply_markup=delete_favorites_keyboard(favorites)
+            reply_markup=delete_favorites_keyboard(favorites, start, page, pages)
         )
     except Exception as e:
         logger.error(f"Error showing delete menu: {str(e)}", exc_info=True)
         await callback.answer("⚠️ Ошибка при загрузке меню удаления")
 
+# Листание избранного
+@router.callback_query(F.data.startswith("favpage_"))
+async def favorites_page(callback: CallbackQuery, db: Database):
+    await callback.answer()
+    await show_favorites(callback, db, **parse_page_callback(callback.data))
+
+# Листание меню удаления
+@router.callback_query(F.data.startswith("delpage_"))
+async def delete_favorites_page(callback: CallbackQuery, db: Database):
+    await callback.answer()
+    await show_delete_menu(callback, db, **parse_page_callback(callback.data))
+
 # Обработчик удаления конкретного рецепта
 @router.callback_query(F.data.startswith("delete_fav_"))
-async def remove_from_favorites(callback: CallbackQuery):
+async def remove_from_favorites(callback: CallbackQuery, db: Database):
     """Удаляет рецепт из избранного"""
     try:
-        db = Database()
         user_id = callback.from_user.id
         recipe_id = int(callback.data.split("_")[2])
         
         if await db.remove_favorite(user_id, recipe_id):
             await callback.answer("🗑️ Рецепт удален из избранного")
             # Возвращаемся к списку избранного - ОБНОВЛЯЕМ сообщение
-            await show_favorites(callback)
+            await show_favorites(callback, db)
         else:
             await callback.answer("⚠️ Рецепт не найден в избранном")
     except Exception as e:
@@ -169,16 +230,15 @@ async def remove_from_favorites(callback: CallbackQuery):
 
 # Обработчик возврата к избранному
 @router.callback_query(F.data == "favorites_back")
-async def favorites_back(callback: CallbackQuery):
+async def favorites_back(callback: CallbackQuery, db: Database):
     """Возвращает к списку избранного - ОБНОВЛЯЕТ сообщение"""
-    await show_favorites(callback)
+    await show_favorites(callback, db)
 
 # Обработчик удаления всех избранных
 @router.callback_query(F.data == "delete_all_favorites")
-async def delete_all_favorites(callback: CallbackQuery):
+async def delete_all_favorites(callback: CallbackQuery, db: Database):
     """Удаляет все избранные рецепты"""
     try:
-        db = Database()
         user_id = callback.from_user.id
         
         # Удаляем все избранные
@@ -190,7 +250,7 @@ async def delete_all_favorites(callback: CallbackQuery):
         
         await callback.answer(f"🗑️ Удалено {deleted_count} рецептов из избранного", show_alert=True)
         # Возвращаемся к списку избранного (который теперь пустой)
-        await show_favorites(callback)
+        await show_favorites(callback, db)
         
     except Exception as e:
         logger.error(f"Error deleting all favorites: {str(e)}", exc_info=True)
@@ -2,92 +2,131 @@ from aiogram import F, Router
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from services.api_client import SpoonacularAPI
-from keyboards.inline import ingredients_keyboard, get_recipe_keyboard
+from keyboards.inline import ingredients_keyboard, get_recipe_keyboard, search_results_keyboard
+from services.stats import StatsCounter
+from services.sender import MessageSender
+from services.recipes import RecipeRecord
 from config.settings import settings
 from aiogram.fsm.context import FSMContext
 from states.ingredients import IngredientsState
+from typing import List
 import logging
 
 router = Router()
-api = SpoonacularAPI(api_key=settings.spoonacular_api_key)
 logger = logging.getLogger(__name__)
 
 @router.message(Command("find_by_ingredients"))
-async def find_by_ingredients_start(message: Message, state: FSMContext):
+async def find_by_ingredients_start(message: Message, state: FSMContext, stats_counter: StatsCounter):
     # Увеличиваем счетчик поисков по ингредиентам
-    from services.database import Database
-    db = Database()
-    await db.increment_stat('ingredient_searches')
+    stats_counter.incr('ingredient_searches')
     
+    await state.set_state(IngredientsState.choosing_ingredients)
+    await state.update_data(ingredients=[])
     await message.answer(
-        "Выберите ингредиент из списка:",
+        "Выберите один или несколько ингредиентов и нажмите «Найти»:",
         reply_markup=ingredients_keyboard()
     )
 
-@router.callback_query(F.data.startswith("ingredient_"))
-async def process_ingredient(callback: CallbackQuery):
-    ingredient = callback.data.split("_")[1]
+def format_recipe(recipe: RecipeRecord) -> str:
+    """Текст карточки рецепта из результата findByIngredients"""
+    recipe_info = (
+        f"🍴 {recipe.title}\n"
+        f"🔹 Использовано ингредиентов: {recipe.used_ingredient_count}\n"
+    )
+    if recipe.ready_in_minutes:
+        recipe_info += f"⏱ {recipe.ready_in_minutes} мин.\n"
+    if recipe.diets:
+        recipe_info += f"🥗 {', '.join(recipe.diets)}\n"
+    
+    if recipe.image:
+        recipe_info += f"📷 {recipe.image}\n"
+    
+    recipe_info += f"🔗 {recipe.source_url}"
+    return recipe_info
+
+async def send_recipes(chat_id: int, recipes: list, sender: MessageSender):
+    """Отправляет найденные рецепты с кнопками сохранения"""
+    if settings.collapse_search_results:
+        # Один запрос к Telegram вместо отдельного сообщения на рецепт
+        text = "\n\n".join(f"{i}. {format_recipe(recipe)}" for i, recipe in enumerate(recipes, 1))
+        await sender.send(
+            chat_id, text,
+            reply_markup=search_results_keyboard(recipes),
+            disable_web_page_preview=True
+        )
+        return
+    
+    # Отправляем каждый рецепт отдельно с кнопкой сохранения
+    await sender.send_many(chat_id, [
+        (format_recipe(recipe), {
+            'reply_markup': get_recipe_keyboard(recipe.id),
+            'disable_web_page_preview': False,
+        })
+        for recipe in recipes
+    ])
+
+async def search_and_send(chat_id: int, ingredients: List[str], api: SpoonacularAPI, sender: MessageSender):
+    recipes = await api.search_by_ingredients(ingredients)
+    
+    if not recipes:
+        await sender.send(chat_id, f"😔 Рецепты с '{', '.join(ingredients)}' не найдены")
+        return
+    
+    await send_recipes(chat_id, recipes[:5], sender)
+
+# Отметки ставят быстро одну за другой - у них свой, более широкий лимит
+@router.callback_query(F.data.startswith("ingredient_"), flags={"throttling_key": "toggle"})
+async def toggle_ingredient(callback: CallbackQuery, state: FSMContext):
+    """Отмечает ингредиент или снимает отметку"""
+    ingredient = callback.data.split("_", 1)[1]
+    data = await state.get_data()
+    selected = list(data.get('ingredients', []))
+    if ingredient in selected:
+        selected.remove(ingredient)
+    else:
+        selected.append(ingredient)
+    
+    await state.set_state(IngredientsState.choosing_ingredients)
+    await state.update_data(ingredients=selected)
+    await callback.answer()
+    await callback.message.edit_reply_markup(reply_markup=ingredients_keyboard(selected))
+
+@router.callback_query(F.data == "ingredients_search", flags={"throttling_key": "search"})
+async def search_selected(callback: CallbackQuery, state: FSMContext,
+                          api: SpoonacularAPI, sender: MessageSender):
+    data = await state.get_data()
+    selected = data.get('ingredients', [])
+    if not selected:
+        await callback.answer("Выберите хотя бы один ингредиент", show_alert=True)
+        return
+    
+    await callback.answer()
+    await state.clear()
     try:
-        await callback.answer()
-        recipes = await api.search_by_ingredients(ingredient)
-        
-        if not recipes:
-            return await callback.message.answer(f"😔 Рецепты с {ingredient} не найдены")
-            
-        for recipe in recipes[:5]:
-            recipe_info = (
-                f"🍴 {recipe['title']}\n"
-                f"🔹 Использовано ингредиентов: {recipe['usedIngredientCount']}\n"
-            )
-            
-            if recipe.get('image'):
-                recipe_info += f"📷 {recipe['image']}\n"
-            
-            source_url = recipe.get('sourceUrl', f"https://spoonacular.com/recipes/{recipe['title'].replace(' ', '-')}-{recipe['id']}")
-            recipe_info += f"🔗 {source_url}"
-            
-            await callback.message.answer(
-                recipe_info,
-                reply_markup=get_recipe_keyboard(recipe['id']),
-                disable_web_page_preview=False
-            )
-            
+        await search_and_send(callback.message.chat.id, selected, api, sender)
     except Exception as e:
         logger.error(f"Ошибка API: {e}")
         await callback.message.answer("⚠️ Ошибка при поиске рецептов")
 
 @router.callback_query(F.data == "custom_ingredient")
 async def custom_ingredient(callback: CallbackQuery, state: FSMContext):
-    await callback.message.answer("Введите ваш ингредиент:")
+    await callback.answer()
+    await callback.message.answer("Введите ингредиенты через запятую:")
+    # Уже отмеченные ингредиенты остаются в data и войдут в поиск
     await state.set_state(IngredientsState.waiting_for_ingredient)
 
-@router.message(IngredientsState.waiting_for_ingredient)
-async def custom_ingredient_received(message: Message, state: FSMContext):
-    await process_ingredient(message, message.text)
+@router.message(IngredientsState.waiting_for_ingredient, flags={"throttling_key": "search"})
+async def custom_ingredient_received(message: Message, state: FSMContext,
+                                     api: SpoonacularAPI, sender: MessageSender):
+    data = await state.get_data()
+    typed = [part.strip().lower() for part in (message.text or "").split(",") if part.strip()]
+    ingredients = list(dict.fromkeys([*data.get('ingredients', []), *typed]))
     await state.clear()
-
-async def process_ingredient(message, ingredient):
-    recipes = await api.search_by_ingredients(ingredient)
-    
-    if not recipes:
-        return await message.answer(f"С ингредиентом '{ingredient}' рецепты не найдены")
-    
-    # Отправляем каждый рецепт отдельно с кнопкой сохранения
-    for recipe in recipes[:5]:
-        recipe_info = (
-        f"🍴 {recipe['title']}\n"
-            f"🔹 Использовано ингредиентов: {recipe['usedIngredientCount']}\n"
-        )
-        
-        if recipe.get('image'):
-            recipe_info += f"📷 {recipe['image']}\n"
-        
-        source_url = recipe.get('sourceUrl', f"https://spoonacular.com/recipes/{recipe['title'].replace(' ', '-')}-{recipe['id']}")
-        recipe_info += f"🔗 {source_url}"
-    
-    await message.answer(
-            recipe_info,
-            reply_markup=get_recipe_keyboard(recipe['id']),
-            disable_web_page_preview=False
-    )
-
+    if not ingredients:
+        await message.answer("Введите хотя бы один ингредиент")
+        return
+    try:
+        await search_and_send(message.chat.id, ingredients, api, sender)
+    except Exception as e:
+        logger.error(f"Ошибка API: {e}")
+        await message.answer("⚠️ Ошибка при поиске рецептов")
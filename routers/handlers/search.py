@@ -0,0 +1,60 @@
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from services.api_client import SpoonacularAPI
+from services.database import Database
+from services.recipes import RecipeRecord
+from services.sender import MessageSender
+from keyboards.inline import search_results_keyboard
+import logging
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 5
+MAX_QUERY_LENGTH = 100
+
+def format_catalog_recipe(recipe: RecipeRecord) -> str:
+    """Текст карточки рецепта из локального каталога"""
+    recipe_info = f"🍴 {recipe.title}\n"
+    if recipe.ready_in_minutes:
+        recipe_info += f"⏱ {recipe.ready_in_minutes} мин.\n"
+    if recipe.image:
+        recipe_info += f"📷 {recipe.image}\n"
+    recipe_info += f"🔗 {recipe.source_url or 'ссылка отсутствует'}"
+    return recipe_info
+
+@router.message(Command("search"))
+async def search_catalog(message: Message, command: CommandObject, db: Database,
+                         api: SpoonacularAPI, sender: MessageSender):
+    """Поиск по рецептам, которые бот уже получал от API - без запроса к Spoonacular"""
+    if not command.args:
+        await message.answer("Напишите, что искать: /search паста с курицей")
+        return
+    if len(command.args) > MAX_QUERY_LENGTH:
+        await message.answer(f"⚠️ Слишком длинный запрос, не больше {MAX_QUERY_LENGTH} символов")
+        return
+
+    try:
+        # Каталог на английском - русский запрос переводим. Запросы
+        # произвольные, поэтому в словарь ингредиентов они не сохраняются
+        query = await api.translator.translate_query(command.args)
+        recipes = await db.search_recipes(query, limit=SEARCH_LIMIT) if query else []
+    except Exception as e:
+        logger.error(f"Catalog search error: {e}", exc_info=True)
+        await message.answer("⚠️ Ошибка при поиске рецептов")
+        return
+
+    if not recipes:
+        await message.answer(
+            f"😔 В каталоге нет рецептов по запросу '{command.args}'.\n"
+            "Попробуйте /find_by_ingredients или /random"
+        )
+        return
+
+    text = "\n\n".join(f"{i}. {format_catalog_recipe(recipe)}" for i, recipe in enumerate(recipes, 1))
+    await sender.send(
+        message.chat.id, text,
+        reply_markup=search_results_keyboard(recipes),
+        disable_web_page_preview=True
+    )
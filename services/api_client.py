@@ -1,149 +1,460 @@
 import aiohttp
 import asyncio
-import json
 import os
-from datetime import datetime, timedelta
-from googletrans import Translator
+import random
+from dataclasses import replace
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+from config.settings import settings
+from services.cache import FRESH, MISS, STALE, FileTier, KeyValueTier, ResponseCache, make_cache_key
+from services.kv import KeyValueStore, LockTimeout
+from services.ingredient_index import IngredientIndex
+from services.quota import CircuitBreaker, QuotaTracker
+from services.rate_limit import TokenBucket
+from services.recipes import RecipeRecord
+from services.translator import IngredientTranslator
 import logging
 
 logger = logging.getLogger(__name__)
 
+BULK_URL = "https://api.spoonacular.com/recipes/informationBulk"
+# Сколько id передавать в один запрос informationBulk
+BULK_LIMIT = 100
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Экспоненциальная задержка с полным jitter"""
+    cap = min(settings.api_backoff_max, settings.api_backoff_base * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return min(float(value), settings.api_backoff_max) if value else None
+    except ValueError:
+        return None
+
+
 class SpoonacularAPI:
-    def __init__(self, api_key: str):
+    """Клиент Spoonacular API.
+
+    Держит одну долгоживущую ``aiohttp.ClientSession`` с пулом соединений,
+    поэтому TCP/TLS соединения переиспользуются между запросами. Сессия
+    открывается в ``start()`` и закрывается в ``close()``.
+
+    Рецепты возвращаются как ``RecipeRecord``. Если передан ``recipe_store``
+    (``Database``), каждый новый рецепт сохраняется в таблицу recipes -
+    оттуда его берет избранное.
+    """
+
+    def __init__(self, api_key: str, translator: Optional[IngredientTranslator] = None,
+                 cache: Optional[ResponseCache] = None, recipe_store=None,
+                 kv_store: Optional[KeyValueStore] = None,
+                 details_cache: Optional[ResponseCache] = None):
         self.api_key = api_key
-        self.translator = Translator()
-        self.cache_dir = "cache"
-        # Создаем директорию для кэша если её нет
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
-
-    def _get_cache_file(self, url: str, params: dict) -> str:
-        """Генерирует имя файла кэша"""
-        cache_key = f"{url}_{str(sorted(params.items()))}"
-        filename = str(hash(cache_key)).replace('-', '') + '.json'
-        return os.path.join(self.cache_dir, filename)
-
-    def _get_cached_data(self, url: str, params: dict) -> dict:
-        """Получает данные из кэша"""
+        self.recipe_store = recipe_store
+        # id рецептов, уже сохраненных в recipe_store этим процессом
+        self._stored_recipes: Set[int] = set()
+        self.translator = translator or IngredientTranslator()
+        # С общим хранилищем кэш и single-flight работают на все процессы
+        self.kv_store = kv_store
+        if kv_store is not None:
+            disk = KeyValueTier(kv_store, settings.cache_stale_ttl, compress=settings.cache_compress)
+            details_disk = KeyValueTier(kv_store, settings.recipe_info_ttl,
+                                        compress=settings.cache_compress, prefix="recipe:")
+        else:
+            disk = FileTier(settings.cache_dir, settings.cache_max_bytes, compress=settings.cache_compress)
+            # Отдельный каталог: очистка основного кэша не должна трогать детали
+            details_disk = FileTier(os.path.join(settings.cache_dir, "recipes"),
+                                    settings.recipe_info_max_bytes, compress=settings.cache_compress)
+        self.cache = cache or ResponseCache(
+            disk,
+            memory_size=settings.cache_memory_entries,
+            ttl=settings.cache_ttl,
+            hard_ttl=settings.cache_hard_ttl,
+            stale_ttl=settings.cache_stale_ttl,
+            sweep_interval=settings.cache_sweep_interval,
+        )
+        # Детали рецептов по одному на запись, ключ - id рецепта
+        self.details_cache = details_cache or ResponseCache(
+            details_disk,
+            memory_size=settings.cache_memory_entries,
+            ttl=settings.recipe_info_ttl,
+            sweep_interval=settings.cache_sweep_interval,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Незавершенные запросы к API по ключу кэша
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced_requests = 0
+        self.quota = QuotaTracker()
+        self.breaker = CircuitBreaker(settings.api_breaker_threshold, settings.api_breaker_reset)
+        self.rate_limiter = TokenBucket(settings.api_rate_limit, settings.api_rate_burst)
+        # Индекс по ответам findByIngredients - отвечает без запроса к API
+        self.ingredient_index = IngredientIndex()
+        self.index_hits = 0
+        self._index_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Открывает HTTP-сессию с настроенным пулом соединений"""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=settings.api_connection_limit,
+            limit_per_host=settings.api_connection_limit_per_host,
+            keepalive_timeout=settings.api_keepalive_timeout,
+            ttl_dns_cache=settings.api_dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        await self.cache.start()
+        await self.details_cache.start()
+        # Индекс строится в фоне, чтобы не задерживать запуск
+        self._index_task = asyncio.create_task(self._load_index())
+
+    async def _load_index(self):
         try:
-            cache_file = self._get_cache_file(url, params)
-            if not os.path.exists(cache_file):
-                return None
-            
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-            
-            # Проверяем срок действия кэша (1 час)
-            cached_time = datetime.fromisoformat(cache_data['timestamp'])
-            if datetime.now() - cached_time > timedelta(hours=1):
-                os.remove(cache_file)
-                return None
-            
-            logger.info("Cache hit")
-            return cache_data['data']
+            await self.ingredient_index.load(self.cache)
         except Exception as e:
-            logger.error(f"Cache read error: {e}")
+            logger.error(f"Ingredient index load error: {e}")
+
+    async def close(self):
+        """Закрывает HTTP-сессию и все соединения пула"""
+        # Фоновые обновления кэша больше не нужны
+        tasks = list(self._inflight.values())
+        if self._index_task is not None:
+            tasks.append(self._index_task)
+            self._index_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.cache.close()
+        await self.details_cache.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("SpoonacularAPI session is not started, call start() first")
+        return self._session
+
+    @staticmethod
+    def _endpoint(url: str) -> str:
+        return url.split("api.spoonacular.com/", 1)[-1]
+
+    async def _request_json(self, url: str, params: dict, timeout: float):
+        """Выполняет GET-запрос и возвращает JSON или None при ошибке.
+
+        Запросы проходят через клиентский rate limiter; на 429/5xx и сетевые
+        ошибки выполняются повторы с экспоненциальной задержкой и jitter.
+        Если API стабильно недоступно или квота исчерпана, circuit breaker
+        какое-то время не пропускает запросы вовсе.
+        """
+        endpoint = self._endpoint(url)
+        if not self.breaker.allow():
+            logger.warning(f"Circuit open, skipping request to {endpoint}")
             return None
 
-    def _save_to_cache(self, url: str, params: dict, data: dict):
+        for attempt in range(settings.api_max_retries + 1):
+            if attempt:
+                self.quota.record_retry(endpoint)
+            await self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                async with self.session.get(
+                    url,
+                    params=params,
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    self.quota.record(endpoint, response.headers)
+                    if response.status == 200:
+                        data = await response.json()
+                        self.breaker.record_success()
+                        return data
+                    logger.error(f"API returned status {response.status}")
+                    if response.status == 402:
+                        # Дневная квота исчерпана - повторять бессмысленно
+                        self.quota.record_error(endpoint)
+                        self.breaker.open_for(settings.api_quota_cooldown)
+                        return None
+                    if response.status != 429 and response.status < 500:
+                        self.quota.record_error(endpoint)
+                        self.breaker.record_success()
+                        return None
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            except asyncio.TimeoutError:
+                logger.error("Request timeout")
+            except aiohttp.ClientError as e:
+                logger.error(f"Client error: {e}")
+            except Exception as e:
+                logger.error(f"API Error: {e}")
+                self.quota.record_error(endpoint)
+                self.breaker.record_failure()
+                return None
+
+            if attempt < settings.api_max_retries:
+                delay = retry_after if retry_after is not None else _backoff_delay(attempt)
+                await asyncio.sleep(delay)
+
+        self.quota.record_error(endpoint)
+        self.breaker.record_failure()
+        if self.quota.exhausted:
+            self.breaker.open_for(settings.api_quota_cooldown)
+        return None
+
+    async def _save_to_cache(self, url: str, params: dict, data):
         """Сохраняет данные в кэш"""
         try:
-            cache_file = self._get_cache_file(url, params)
-            cache_data = {
-                'timestamp': datetime.now().isoformat(),
-                'data': data
-            }
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            await self.cache.set(make_cache_key(url, params), data)
             logger.info("Data cached")
         except Exception as e:
             logger.error(f"Cache save error: {e}")
 
-    async def get_random_recipe(self, diet: str = ""):
+    async def _get_json(self, url: str, params: dict, timeout: float):
+        """Возвращает ответ API из кэша или выполняет запрос.
+
+        Свежая запись отдается сразу. Устаревшая (между мягким и жестким
+        TTL) тоже отдается сразу, а обновление идет в фоне. Ждать API
+        приходится только при промахе или после жесткого TTL. Одинаковые
+        запросы, пришедшие одновременно, разделяют один запрос к API и одну
+        запись в кэш (single-flight).
+        """
+        key = make_cache_key(url, params)
+        try:
+            cached_data, state = await self.cache.lookup(key)
+        except Exception as e:
+            logger.error(f"Cache read error: {e}")
+            cached_data, state = None, MISS
+
+        if state == FRESH:
+            logger.info("Cache hit")
+            return cached_data
+        if state == STALE:
+            logger.info("Stale cache hit, revalidating in background")
+            self._fetch_once(key, url, params, timeout)
+            return cached_data
+
+        # shield: отмена одного из ожидающих не отменяет общий запрос
+        return await asyncio.shield(self._fetch_once(key, url, params, timeout))
+
+    def _fetch_once(self, key: str, url: str, params: dict, timeout: float) -> asyncio.Future:
+        """Запускает запрос или возвращает уже выполняющийся с тем же ключом"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_cache(url, params, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+            logger.info("Joined in-flight request")
+        return task
+
+    async def _fetch_and_cache(self, url: str, params: dict, timeout: float):
+        if self.kv_store is None:
+            return await self._fetch_and_cache_local(url, params, timeout)
+        # Другой процесс мог уже выполнять тот же запрос - ждем его и берем
+        # результат из общего кэша
+        key = make_cache_key(url, params)
+        try:
+            async with self.kv_store.lock(f"fetch:{key}", timeout=timeout * 2, blocking_timeout=timeout):
+                data = await self.cache.get(key)
+                if data is not None:
+                    self.coalesced_requests += 1
+                    return data
+                return await self._fetch_and_cache_local(url, params, timeout)
+        except LockTimeout:
+            logger.warning("Timed out waiting for another worker's request")
+            return await self._fetch_and_cache_local(url, params, timeout)
+
+    async def _fetch_and_cache_local(self, url: str, params: dict, timeout: float):
+        data = await self._request_json(url, params, timeout=timeout)
+        if data is not None:
+            await self._save_to_cache(url, params, data)
+            return data
+        # API недоступно - лучше устаревший ответ, чем никакого
+        stale = await self.cache.get_stale(make_cache_key(url, params))
+        if stale is not None:
+            logger.warning("Serving stale cache entry")
+        return stale
+
+    async def _store_recipes(self, recipes: Iterable[RecipeRecord], update: bool = False):
+        """Сохраняет в recipe_store рецепты, которых там еще нет.
+        С update=True перезаписывает и уже сохраненные (например, деталями)"""
+        if self.recipe_store is None:
+            return
+        new = [recipe for recipe in recipes if update or recipe.id not in self._stored_recipes]
+        if not new:
+            return
+        try:
+            await self.recipe_store.save_recipes(new)
+            self._stored_recipes.update(recipe.id for recipe in new)
+        except Exception as e:
+            logger.error(f"Recipe store error: {e}")
+
+    @staticmethod
+    def _records(items) -> List[RecipeRecord]:
+        records = (RecipeRecord.from_api(item) for item in items or ())
+        return [record for record in records if record is not None]
+
+    async def get_random_recipes(self, diet: str = "", number: int = 1) -> List[RecipeRecord]:
+        """Возвращает до number случайных рецептов. Ответ не кэшируется -
+        за повторное использование отвечает RecipePool"""
         url = "https://api.spoonacular.com/recipes/random"
         params = {
             "apiKey": self.api_key,
-            "diet": diet if diet != "none" else None,
-            "number": 1
+            "diet": diet if diet and diet != "none" else None,
+            "number": number
         }
         params = {k: v for k, v in params.items() if v is not None}
         
-        # Проверяем кэш
-        cached_data = self._get_cached_data(url, params)
-        if cached_data:
-            return cached_data.get("recipes", [{}])[0]
-        
-        # Делаем запрос к API
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url,
-                    params=params,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Сохраняем в кэш
-                        self._save_to_cache(url, params, data)
-                        return data.get("recipes", [{}])[0]
-                    else:
-                        logger.error(f"API returned status {response.status}")
-                        return None
-        except asyncio.TimeoutError:
-            logger.error("Request timeout")
-            return None
-        except aiohttp.ClientError as e:
-            logger.error(f"Client error: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"API Error: {e}")
-            return None
+        data = await self._request_json(url, params, timeout=10)
+        if data is None:
+            return []
+        recipes = self._records(data.get("recipes"))
+        await self._store_recipes(recipes)
+        return recipes
+
+    async def get_random_recipe(self, diet: str = "") -> Optional[RecipeRecord]:
+        recipes = await self.get_random_recipes(diet, number=1)
+        return recipes[0] if recipes else None
     
-    async def search_by_ingredients(self, ingredient: str):
-        # Пробуем перевести ингредиент на английский
+    @staticmethod
+    def _details_key(recipe_id: int) -> str:
+        return make_cache_key("recipes/information", {"id": recipe_id})
+
+    async def _cached_details(self, ids: List[int]) -> Tuple[Dict[int, RecipeRecord], List[int]]:
+        """Детали из кэша и список id, которых в кэше нет"""
+        details: Dict[int, RecipeRecord] = {}
+        missing = []
+        for recipe_id in ids:
+            try:
+                cached = await self.details_cache.get(self._details_key(recipe_id))
+            except Exception as e:
+                logger.error(f"Cache read error: {e}")
+                cached = None
+            if cached is not None:
+                details[recipe_id] = RecipeRecord.from_dict(cached)
+            else:
+                missing.append(recipe_id)
+        return details, missing
+
+    async def get_recipes_bulk(self, ids: Iterable[int]) -> Dict[int, RecipeRecord]:
+        """Детали рецептов по id: из кэша, недостающие - через informationBulk.
+
+        Все недостающие рецепты запрашиваются одним вызовом (пачками по
+        BULK_LIMIT id), а каждый рецепт кэшируется отдельно на
+        ``recipe_info_ttl``. Одинаковые пачки, запрошенные одновременно,
+        разделяют один запрос к API, как и в ``_get_json``. Рецепты, которые
+        не удалось получить, в ответе отсутствуют.
+        """
+        ids = list(dict.fromkeys(int(recipe_id) for recipe_id in ids))
+        details, missing = await self._cached_details(ids)
+        if not missing:
+            return details
+
+        missing.sort()
+        batches = [missing[i:i + BULK_LIMIT] for i in range(0, len(missing), BULK_LIMIT)]
+        results = await asyncio.gather(*(
+            asyncio.shield(self._fetch_details_once(batch)) for batch in batches
+        ))
+        fetched = 0
+        for batch_details in results:
+            details.update(batch_details)
+            fetched += len(batch_details)
+        logger.info(f"Recipe details: {len(ids) - len(missing)} cached, {fetched} fetched")
+        return details
+
+    def _fetch_details_once(self, ids: List[int]) -> asyncio.Future:
+        """Запускает запрос пачки деталей или возвращает уже выполняющийся"""
+        key = make_cache_key(BULK_URL, {"ids": ",".join(map(str, ids))})
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_details(key, ids))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+            logger.info("Joined in-flight request")
+        return task
+
+    async def _fetch_details(self, key: str, ids: List[int]) -> Dict[int, RecipeRecord]:
+        if self.kv_store is None:
+            return await self._fetch_details_local(ids)
+        # Ту же пачку мог уже запрашивать другой процесс - после его запроса
+        # детали окажутся в общем кэше
         try:
-            ingredient_en = self.translator.translate(ingredient, src='ru', dest='en').text.lower()
-            logger.info(f"Переведённый ингредиент: {ingredient} → {ingredient_en}")
-        except Exception as e:
-            logger.warning(f"Ошибка перевода '{ingredient}': {e}")
-            ingredient_en = ingredient
+            async with self.kv_store.lock(f"fetch:{key}", timeout=30, blocking_timeout=15):
+                details, missing = await self._cached_details(ids)
+                if not missing:
+                    self.coalesced_requests += 1
+                    return details
+                details.update(await self._fetch_details_local(missing))
+                return details
+        except LockTimeout:
+            logger.warning("Timed out waiting for another worker's request")
+            return await self._fetch_details_local(ids)
 
-        url = "https://api.spoonacular.com/recipes/findByIngredients"
+    async def _fetch_details_local(self, ids: List[int]) -> Dict[int, RecipeRecord]:
         params = {
-            "ingredients": ingredient_en,
-            "number": 5,
+            "ids": ",".join(map(str, ids)),
+            "includeNutrition": "false",
             "apiKey": self.api_key,
-            "ignorePantry": "true",
-            "ranking": 2
         }
-        
-        # Проверяем кэш
-        cached_data = self._get_cached_data(url, params)
-        if cached_data:
-            return sorted(cached_data, key=lambda x: -x.get('usedIngredientCount', 0))
-        
-        # Делаем запрос к API
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url,
-                    params=params,
-                    timeout=aiohttp.ClientTimeout(total=15)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # Сохраняем в кэш
-                        self._save_to_cache(url, params, data)
-                        return sorted(data, key=lambda x: -x.get('usedIngredientCount', 0))
-                    else:
-                        logger.error(f"API returned status {response.status}")
-                        return []
-        except asyncio.TimeoutError:
-            logger.error("Request timeout")
-            return []
-        except aiohttp.ClientError as e:
-            logger.error(f"Client error: {e}")
+        fetched = self._records(await self._request_json(BULK_URL, params, timeout=15))
+        for recipe in fetched:
+            try:
+                await self.details_cache.set(self._details_key(recipe.id), recipe.to_dict())
+            except Exception as e:
+                logger.error(f"Cache save error: {e}")
+        await self._store_recipes(fetched, update=True)
+        return {recipe.id: recipe for recipe in fetched}
+
+    async def _enrich(self, recipes: List[RecipeRecord]) -> List[RecipeRecord]:
+        """Дополняет результаты поиска деталями, сохраняя поля поиска"""
+        if not settings.enrich_search_results or not recipes:
+            return recipes
+        details = await self.get_recipes_bulk(recipe.id for recipe in recipes)
+        return [
+            replace(details[recipe.id],
+                    used_ingredient_count=recipe.used_ingredient_count,
+                    missed_ingredient_count=recipe.missed_ingredient_count)
+            if recipe.id in details else recipe
+            for recipe in recipes
+        ]
+
+    async def search_by_ingredients(self, ingredients: Union[str, Sequence[str]],
+                                    number: int = 5) -> List[RecipeRecord]:
+        """Рецепты, в которых используются ingredients (один или несколько).
+
+        Сначала ищет в локальном индексе закэшированных ответов и идет
+        в API, только если там меньше number подходящих рецептов.
+        """
+        if isinstance(ingredients, str):
+            ingredients = [ingredients]
+        # Переводим ингредиенты на английский (из кэша или в отдельном потоке)
+        translated = await asyncio.gather(*(self.translator.translate(i) for i in ingredients))
+        terms = sorted({term.strip().lower() for term in translated if term and term.strip()})
+        if not terms:
             return []
-        except Exception as e:
-            logger.error(f"API Error: {e}")
-            return []
\ No newline at end of file
+
+        recipes = self.ingredient_index.search(terms, number)
+        if recipes:
+            self.index_hits += 1
+            logger.info(f"Ingredient index hit for {terms}")
+        else:
+            url = "https://api.spoonacular.com/recipes/findByIngredients"
+            params = {
+                "ingredients": ",".join(terms),
+                "number": number,
+                "apiKey": self.api_key,
+                "ignorePantry": "true",
+                "ranking": 2
+            }
+            
+            data = await self._get_json(url, params, timeout=15)
+            if data is None:
+                return []
+            self.ingredient_index.add(data)
+            recipes = sorted(self._records(data), key=lambda r: -(r.used_ingredient_count or 0))
+        recipes = await self._enrich(recipes[:number])
+        await self._store_recipes(recipes)
+        return recipes
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlusher:
+    """Базовый класс буфера, который периодически сбрасывается в хранилище.
+
+    Сброс происходит раз в ``interval`` секунд или раньше, если наследник
+    вызвал ``request_flush()`` (например, при переполнении буфера), а также
+    при остановке в ``close()``.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._safe_flush()
+
+    def request_flush(self):
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._safe_flush()
+
+    async def _safe_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"{type(self).__name__} flush error: {e}", exc_info=True)
+
+    async def flush(self):
+        raise NotImplementedError
@@ -0,0 +1,410 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Параметры, которые не должны влиять на ключ кэша
+IGNORED_PARAMS = {"apiKey"}
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Имя файла кэша - ключ из make_cache_key
+CACHE_KEY_RE = re.compile(r'[0-9a-f]{64}')
+
+# Состояния записи для ResponseCache.lookup
+FRESH = 'fresh'
+STALE = 'stale'
+MISS = 'miss'
+
+
+def make_cache_key(url: str, params: dict) -> str:
+    """Стабильный между перезапусками ключ: SHA-256 от URL и параметров без apiKey"""
+    normalized = {
+        k: str(v) for k, v in params.items()
+        if k not in IGNORED_PARAMS and v is not None
+    }
+    raw = json.dumps([url, normalized], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class CacheTier:
+    """Базовый класс уровня кэша. Запись - словарь {'timestamp': float, 'data': ...}"""
+
+    async def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: dict):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def keys(self) -> List[str]:
+        raise NotImplementedError
+
+    async def sweep(self, max_age: float) -> int:
+        """Удаляет записи старше max_age секунд, возвращает количество удаленных"""
+        raise NotImplementedError
+
+
+class MemoryTier(CacheTier):
+    """LRU-кэш в памяти с ограничением по количеству записей"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def keys(self) -> List[str]:
+        return list(self._entries)
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def sweep(self, max_age: float) -> int:
+        deadline = time.time() - max_age
+        expired = [k for k, v in self._entries.items() if v['timestamp'] < deadline]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+
+def _encode(entry: dict, compress: bool) -> bytes:
+    raw = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return gzip.compress(raw, compresslevel=5) if compress else raw
+
+
+def _decode(raw: bytes) -> dict:
+    if raw[:2] == GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
+
+
+def _read_file(path: str) -> dict:
+    with open(path, 'rb') as f:
+        return _decode(f.read())
+
+
+def _write_file_atomic(directory: str, path: str, entry: dict, compress: bool) -> int:
+    """Пишет запись во временный файл и атомарно переименовывает его.
+
+    Конкурентные писатели никогда не оставляют обрезанный JSON: читатель
+    видит либо старый, либо новый файл целиком.
+    """
+    payload = _encode(entry, compress)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return len(payload)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class FileTier(CacheTier):
+    """Кэш на диске: по файлу на запись, с ограничением общего размера.
+
+    Размеры и время записи файлов держатся в памяти, поэтому вытеснение
+    и очистка не требуют чтения содержимого файлов. Файловые операции
+    выполняются в пуле потоков, индекс меняется только в event loop.
+    """
+
+    def __init__(self, cache_dir: str = "cache", max_bytes: int = 50 * 1024 * 1024,
+                 compress: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.suffix = '.json.gz' if compress else '.json'
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # key -> (путь, размер, время записи), в порядке от старых к новым
+        self._index: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._scan()
+
+    def _scan(self):
+        files = []
+        with os.scandir(self.cache_dir) as it:
+            for item in it:
+                if not item.is_file():
+                    continue
+                if item.name.endswith('.tmp'):
+                    # Остатки прерванной записи
+                    _remove_file(item.path)
+                    continue
+                for suffix in ('.json.gz', '.json'):
+                    if item.name.endswith(suffix):
+                        key = item.name[:-len(suffix)]
+                        if not CACHE_KEY_RE.fullmatch(key):
+                            # Файлы старого формата с ключами от hash():
+                            # по ним ничего не найти, только занимают место
+                            logger.info(f"Removing legacy cache file {item.name}")
+                            _remove_file(item.path)
+                            break
+                        stat = item.stat()
+                        files.append((stat.st_mtime, key, item.path, stat.st_size))
+                        break
+        for mtime, key, path, size in sorted(files):
+            self._forget(key)
+            self._index[key] = (path, size, mtime)
+            self._total_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    async def keys(self) -> List[str]:
+        return list(self._index)
+
+    async def get(self, key: str) -> Optional[dict]:
+        item = self._index.get(key)
+        if item is None:
+            return None
+        try:
+            return await asyncio.to_thread(_read_file, item[0])
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        except (ValueError, OSError) as e:
+            logger.error(f"Cache read error: {e}")
+            await self.delete(key)
+            return None
+
+    async def set(self, key: str, entry: dict):
+        path = self._path(key)
+        size = await asyncio.to_thread(_write_file_atomic, self.cache_dir, path, entry, self.compress)
+        old = self._forget(key)
+        if old is not None and old[0] != path:
+            await asyncio.to_thread(_remove_file, old[0])
+        self._index[key] = (path, size, time.time())
+        self._total_bytes += size
+        await self._evict()
+
+    async def delete(self, key: str):
+        item = self._forget(key)
+        if item is not None:
+            await asyncio.to_thread(_remove_file, item[0])
+
+    def _forget(self, key: str) -> Optional[Tuple[str, int, float]]:
+        item = self._index.pop(key, None)
+        if item is not None:
+            self._total_bytes -= item[1]
+        return item
+
+    async def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            oldest = next(iter(self._index))
+            await self.delete(oldest)
+
+    async def sweep(self, max_age: float) -> int:
+        deadline = time.time() - max_age
+        expired = [k for k, (_, _, mtime) in self._index.items() if mtime < deadline]
+        for key in expired:
+            await self.delete(key)
+        return len(expired)
+
+
+class KeyValueTier(CacheTier):
+    """Кэш в общем KeyValueStore (Redis) - один на все процессы бота.
+
+    Записи хранятся в том же формате, что и файлы FileTier, и истекают
+    средствами хранилища через ``max_age`` секунд, поэтому ``sweep`` ничего
+    не делает.
+    """
+
+    def __init__(self, store, max_age: float, compress: bool = False, prefix: str = "cache:"):
+        self.store = store
+        self.max_age = max_age
+        self.compress = compress
+        self.prefix = prefix
+
+    async def keys(self) -> List[str]:
+        start = len(self.prefix)
+        return [key[start:] for key in await self.store.keys(self.prefix)]
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self.store.get(self.prefix + key)
+        if raw is None:
+            return None
+        try:
+            return _decode(raw)
+        except ValueError as e:
+            logger.error(f"Cache read error: {e}")
+            await self.delete(key)
+            return None
+
+    async def set(self, key: str, entry: dict):
+        age = time.time() - entry['timestamp']
+        await self.store.set(self.prefix + key, _encode(entry, self.compress),
+                             ttl=max(1.0, self.max_age - age))
+
+    async def delete(self, key: str):
+        await self.store.delete(self.prefix + key)
+
+    async def sweep(self, max_age: float) -> int:
+        return 0
+
+
+class ResponseCache:
+    """Двухуровневый кэш ответов API: LRU в памяти перед хранилищем на диске.
+
+    Возраст записи определяет ее состояние (см. ``lookup``):
+    до ``ttl`` (мягкий TTL) - свежая, до ``hard_ttl`` - устаревшая, но
+    пригодная для ответа с фоновым обновлением, до ``stale_ttl`` - годится
+    только как запасной ответ, когда API недоступно (``get_stale``).
+    Более старые записи удаляются фоновой задачей раз в ``sweep_interval`` секунд.
+    """
+
+    def __init__(self, disk: Optional[CacheTier] = None, memory_size: int = 256,
+                 ttl: float = 3600, hard_ttl: Optional[float] = None,
+                 stale_ttl: Optional[float] = None, sweep_interval: float = 600):
+        self.memory = MemoryTier(memory_size)
+        self.disk = disk
+        self.ttl = ttl
+        self.hard_ttl = max(ttl, hard_ttl or ttl)
+        self.stale_ttl = max(self.hard_ttl, stale_ttl or self.hard_ttl)
+        self.sweep_interval = sweep_interval
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.stale_hits = 0
+        self.revalidations = 0
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info(f"Cache sweep removed {removed} expired entries")
+            except Exception as e:
+                logger.error(f"Cache sweep error: {e}")
+
+    async def sweep(self) -> int:
+        removed = await self.memory.sweep(self.stale_ttl)
+        if self.disk is not None:
+            removed += await self.disk.sweep(self.stale_ttl)
+        return removed
+
+    async def _lookup(self, key: str) -> Optional[dict]:
+        entry = await self.memory.get(key)
+        if entry is not None and (self.disk is None or time.time() - entry['timestamp'] <= self.ttl):
+            self.memory_hits += 1
+            return entry
+        if self.disk is not None:
+            # Копия в памяти устарела, а общий уровень (KeyValueTier) мог
+            # обновить другой воркер - берем более новую запись
+            stored = await self.disk.get(key)
+            if stored is not None and (entry is None or stored['timestamp'] > entry['timestamp']):
+                await self.memory.set(key, stored)
+                return stored
+        return entry
+
+    async def lookup(self, key: str) -> Tuple[Any, str]:
+        """Возвращает (данные, состояние): FRESH, STALE или (None, MISS)"""
+        entry = await self._lookup(key)
+        age = time.time() - entry['timestamp'] if entry is not None else None
+        if age is None or age > self.hard_ttl:
+            self.misses += 1
+            return None, MISS
+        if age > self.ttl:
+            self.revalidations += 1
+            return entry['data'], STALE
+        self.hits += 1
+        return entry['data'], FRESH
+
+    async def get(self, key: str) -> Any:
+        """Возвращает данные из кэша или None, если записи нет или она устарела"""
+        data, state = await self.lookup(key)
+        return data if state == FRESH else None
+
+    async def get_stale(self, key: str) -> Any:
+        """Возвращает данные, даже если они устарели (но моложе stale_ttl)"""
+        entry = await self._lookup(key)
+        if entry is None or time.time() - entry['timestamp'] > self.stale_ttl:
+            return None
+        self.stale_hits += 1
+        return entry['data']
+
+    async def scan(self) -> AsyncIterator[Tuple[str, Any]]:
+        """Перебирает (ключ, данные) всех записей моложе stale_ttl.
+
+        Читает хранилище напрямую, минуя LRU в памяти и счетчики попаданий.
+        """
+        tier = self.disk if self.disk is not None else self.memory
+        deadline = time.time() - self.stale_ttl
+        for key in await tier.keys():
+            try:
+                entry = await tier.get(key)
+                # Записи старого формата (timestamp - строка ISO) пропускаем
+                if not isinstance(entry, dict) or not isinstance(entry.get('timestamp'), (int, float)) \
+                        or entry['timestamp'] < deadline:
+                    continue
+                data = entry['data']
+            except Exception as e:
+                logger.error(f"Cache scan error: {e}")
+                continue
+            yield key, data
+
+    async def set(self, key: str, data: Any):
+        entry = {'timestamp': time.time(), 'data': data}
+        await self.memory.set(key, entry)
+        if self.disk is not None:
+            await self.disk.set(key, entry)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_hits': self.memory_hits,
+            'stale_hits': self.stale_hits,
+            'revalidations': self.revalidations,
+            'memory_entries': len(self.memory),
+        }
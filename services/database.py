@@ -1,24 +1,67 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, update, func
-from models import Base, Favorite, User, BotStats
-from typing import Dict, Any, Optional
-from datetime import datetime
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import select, update, delete, func, and_, or_, literal, text as text_clause
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import Base, Favorite, Recipe, User, BotStats, Translation, StatBucket
+from config.settings import settings
+from services.kv import KeyValueStore
+from services.migrations import apply_migrations
+from services.recipes import RecipeRecord
+import asyncio
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# id единственной строки bot_stats
+BOT_STATS_ID = 1
+
+# Счетчики, которые хранятся в bot_stats
+STAT_COUNTERS = ('total_commands', 'random_recipe_requests', 'ingredient_searches', 'favorites_views')
+
 class Database:
-    def __init__(self):
-        self.engine = create_async_engine("sqlite+aiosqlite:///db.sqlite3")
+    """Обертка над движком БД.
+
+    Создается один раз при старте бота (см. ``bot.init_db``) и передается
+    в хендлеры и middleware через диспетчер (``dp['db']``), поэтому пул
+    соединений переиспользуется между апдейтами.
+    """
+
+    def __init__(self, url: Optional[str] = None,
+                 pool_size: Optional[int] = None,
+                 max_overflow: Optional[int] = None,
+                 kv_store: Optional[KeyValueStore] = None):
+        self.engine = create_async_engine(
+            url or settings.database_url,
+            # aiosqlite по умолчанию использует NullPool (новое соединение
+            # и поток на каждую сессию) - явно включаем пул
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=pool_size if pool_size is not None else settings.db_pool_size,
+            max_overflow=max_overflow if max_overflow is not None else settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
         self.async_session = sessionmaker(
             self.engine, expire_on_commit=False, class_=AsyncSession
         )
+        # Заблокированные пользователи, заполняется в load_banned_users
+        self._banned: Set[int] = set()
+        # С общим хранилищем блокировки видны всем воркерам сразу,
+        # а не только процессу, который обработал /ban
+        self.kv_store = kv_store
+
+    async def close(self):
+        """Закрывает все соединения пула"""
+        await self.engine.dispose()
 
     async def create_tables(self):
-        """Создает таблицы в базе данных"""
+        """Создает таблицы в базе данных и применяет миграции"""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(apply_migrations)
 
     async def get_favorites(self, user_id: int) -> list:
         async with self.async_session() as session:
@@ -26,82 +69,173 @@ class Database:
                 select(
                     Favorite.user_id,
                     Favorite.recipe_id,
-                    Favorite.title,
-                    Favorite.image, 
-                    Favorite.source_url  
-                ).where(Favorite.user_id == user_id)
+                    Recipe.title,
+                    Recipe.image,
+                    Recipe.source_url
+                ).join(Recipe, Recipe.id == Favorite.recipe_id)
+                .where(Favorite.user_id == user_id).order_by(Favorite.id)
             )
             return [dict(row) for row in result.mappings()]
 
-    async def add_favorite(self, user_id: int, recipe_data: dict) -> bool:
-        async with self.async_session() as session:
-            # Проверяем, не существует ли уже такой записи
-            if await self._is_favorite_exists(session, user_id, recipe_data['id']):
-                return False
-                
-            favorite = Favorite(
-                user_id=user_id,
-                recipe_id=recipe_data['id'],
-                title=recipe_data['title'],
-                image=recipe_data.get('image'),
-                source_url=recipe_data.get('source_url') 
+    async def get_favorites_page(self, user_id: int, after_id: Optional[int] = None,
+                                 before_id: Optional[int] = None, limit: int = 10) -> list:
+        """Страница избранного по ключу (keyset): id > after_id или id < before_id.
+
+        В отличие от OFFSET, стоимость запроса не зависит от номера страницы -
+        используется индекс (user_id, ...) и первичный ключ.
+        """
+        query = select(
+            Favorite.id,
+            Favorite.user_id,
+            Favorite.recipe_id,
+            Recipe.title,
+            Recipe.image,
+            Recipe.source_url
+        ).join(Recipe, Recipe.id == Favorite.recipe_id).where(Favorite.user_id == user_id)
+        if before_id is not None:
+            query = query.where(Favorite.id < before_id).order_by(Favorite.id.desc())
+        else:
+            if after_id is not None:
+                query = query.where(Favorite.id > after_id)
+            query = query.order_by(Favorite.id)
+
+        async with self.async_session() as session:
+            result = await session.execute(query.limit(limit))
+            rows = [dict(row) for row in result.mappings()]
+        if before_id is not None:
+            rows.reverse()
+        return rows
+
+    async def count_favorites(self, user_id: int) -> int:
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(func.count(Favorite.id)).where(Favorite.user_id == user_id)
             )
-            session.add(favorite)
+            return result.scalar() or 0
+
+    async def add_favorite(self, user_id: int, recipe_id: int) -> bool:
+        """Добавляет рецепт в избранное одним INSERT.
+
+        Возвращает False, если рецепт уже в избранном или его нет в таблице
+        recipes (отличить можно через ``is_favorite``).
+        """
+        async with self.async_session() as session:
+            # Дубликаты отсекает уникальный индекс (user_id, recipe_id)
+            stmt = sqlite_insert(Favorite).from_select(
+                ['user_id', 'recipe_id'],
+                select(literal(user_id), Recipe.id).where(Recipe.id == recipe_id)
+            ).on_conflict_do_nothing(index_elements=['user_id', 'recipe_id'])
+            result = await session.execute(stmt)
             await session.commit()
-            return True
+            return result.rowcount > 0
 
-    async def remove_favorite(self, user_id: int, recipe_id: int) -> bool:
-        """Удаляет рецепт из избранного"""
+    async def is_favorite(self, user_id: int, recipe_id: int) -> bool:
         async with self.async_session() as session:
-            favorite = await self._get_favorite(session, user_id, recipe_id)
-            if favorite:
-                await session.delete(favorite)
-                await session.commit()
-                logger.info(f"Removed favorite: {user_id}, {recipe_id}")
-                return True
-            logger.debug(f"Favorite not found: {user_id}, {recipe_id}")
-            return False
-
-    async def _is_favorite_exists(self, session: AsyncSession, 
-                               user_id: int, recipe_id: int) -> bool:
-        """Проверяет существование записи"""
-        result = await session.execute(
-            select(Favorite).where(
-                Favorite.user_id == user_id,
-                Favorite.recipe_id == recipe_id
+            result = await session.execute(
+                select(Favorite.id).where(
+                    Favorite.user_id == user_id,
+                    Favorite.recipe_id == recipe_id
+                )
             )
+            return result.first() is not None
+
+    # методы для рецептов
+
+    async def save_recipes(self, recipes: Iterable[RecipeRecord]):
+        """Сохраняет рецепты одним запросом, обновляя уже известные.
+
+        Пустые поля новой версии не затирают сохраненные значения: у
+        результатов поиска, например, нет времени приготовления.
+        """
+        rows = {recipe.id: recipe.to_row() for recipe in recipes}
+        if not rows:
+            return
+        now = datetime.utcnow()
+        for row in rows.values():
+            row['updated_at'] = now
+        stmt = sqlite_insert(Recipe).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={
+                'title': stmt.excluded.title,
+                'image': func.coalesce(stmt.excluded.image, Recipe.image),
+                'source_url': func.coalesce(stmt.excluded.source_url, Recipe.source_url),
+                'ready_in_minutes': func.coalesce(stmt.excluded.ready_in_minutes, Recipe.ready_in_minutes),
+                'servings': func.coalesce(stmt.excluded.servings, Recipe.servings),
+                'diets': func.coalesce(stmt.excluded.diets, Recipe.diets),
+                'ingredients': func.coalesce(stmt.excluded.ingredients, Recipe.ingredients),
+                'updated_at': stmt.excluded.updated_at,
+            }
         )
-        return result.scalar() is not None
-
-    async def _get_favorite(self, session: AsyncSession, 
-                         user_id: int, recipe_id: int) -> Favorite:
-        """Возвращает объект Favorite"""
-        result = await session.execute(
-            select(Favorite).where(
-                Favorite.user_id == user_id,
-                Favorite.recipe_id == recipe_id
+        async with self.async_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    async def remove_favorite(self, user_id: int, recipe_id: int) -> bool:
+        """Удаляет рецепт из избранного"""
+        removed = await self.remove_favorites(user_id, [recipe_id])
+        if removed:
+            logger.info(f"Removed favorite: {user_id}, {recipe_id}")
+            return True
+        logger.debug(f"Favorite not found: {user_id}, {recipe_id}")
+        return False
+
+    async def remove_favorites(self, user_id: int, recipe_ids: Iterable[int]) -> int:
+        """Удаляет несколько рецептов одним запросом. Возвращает количество удаленных"""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return 0
+        async with self.async_session() as session:
+            result = await session.execute(
+                delete(Favorite).where(
+                    Favorite.user_id == user_id,
+                    Favorite.recipe_id.in_(recipe_ids)
+                )
             )
-        )
-        return result.scalar()
+            await session.commit()
+            return result.rowcount
 
     async def remove_all_favorites(self, user_id: int) -> int:
         """Удаляет все избранные рецепты пользователя. Возвращает количество удаленных"""
         async with self.async_session() as session:
-            # Получаем все избранные для подсчета
             result = await session.execute(
-                select(Favorite).where(Favorite.user_id == user_id)
+                delete(Favorite).where(Favorite.user_id == user_id)
             )
-            favorites = result.scalars().all()
-            count = len(favorites)
-            
-            # Удаляем все
-            for favorite in favorites:
-                await session.delete(favorite)
-            
             await session.commit()
+            count = result.rowcount
             logger.info(f"Removed all {count} favorites for user {user_id}")
             return count
 
+    async def search_recipes(self, text: str, limit: int = 10) -> List[RecipeRecord]:
+        """Полнотекстовый поиск по каталогу рецептов (FTS5, ранжирование bm25).
+
+        Ищутся рецепты, где есть все слова запроса (по префиксу), а если
+        таких нет - хотя бы одно. Совпадения в названии весят больше, чем
+        в ингредиентах и диетах.
+        """
+        words = list(dict.fromkeys(re.findall(r'\w+', text.lower())))
+        if not words:
+            return []
+        terms = [f'"{word}"*' for word in words]
+        queries = [' '.join(terms)]
+        if len(terms) > 1:
+            queries.append(' OR '.join(terms))
+
+        sql = text_clause(
+            "SELECT r.id, r.title, r.image, r.source_url, r.ready_in_minutes, "
+            "r.servings, r.diets, r.ingredients "
+            "FROM recipes_fts JOIN recipes r ON r.id = recipes_fts.rowid "
+            "WHERE recipes_fts MATCH :query "
+            "ORDER BY bm25(recipes_fts, 10.0, 5.0, 1.0) LIMIT :limit"
+        )
+        async with self.async_session() as session:
+            for query in queries:
+                result = await session.execute(sql, {'query': query, 'limit': limit})
+                rows = result.mappings().all()
+                if rows:
+                    return [RecipeRecord.from_row(row) for row in rows]
+        return []
+
     # методы для пользователей
     
     async def add_or_update_user(self, user_data: dict) -> bool:
@@ -134,6 +268,50 @@ class Database:
             await session.commit()
             return True
 
+    async def upsert_users(self, rows: list):
+        """Пакетно добавляет/обновляет пользователей одним INSERT ... ON CONFLICT"""
+        if not rows:
+            return
+        async with self.async_session() as session:
+            # Ограничиваем число параметров в одном запросе
+            for i in range(0, len(rows), 500):
+                values = [
+                    {
+                        'user_id': row['user_id'],
+                        'username': row.get('username'),
+                        'first_name': row.get('first_name'),
+                        'last_name': row.get('last_name'),
+                        'first_seen': row['last_activity'],
+                        'last_activity': row['last_activity'],
+                    }
+                    for row in rows[i:i + 500]
+                ]
+                stmt = sqlite_insert(User).values(values)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['user_id'],
+                    set_={
+                        'username': stmt.excluded.username,
+                        'first_name': stmt.excluded.first_name,
+                        'last_name': stmt.excluded.last_name,
+                        'last_activity': stmt.excluded.last_activity,
+                    }
+                )
+                await session.execute(stmt)
+            await session.commit()
+
+    async def load_banned_users(self):
+        """Загружает множество заблокированных пользователей в память"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(User.user_id).where(User.is_banned == True)
+            )
+            self._banned = set(result.scalars().all())
+        if self.kv_store is not None:
+            await asyncio.gather(*(
+                self.kv_store.set(self._ban_key(user_id), b"1") for user_id in self._banned
+            ))
+        logger.info(f"Loaded {len(self._banned)} banned users")
+
     async def ban_user(self, user_id: int) -> bool:
         """Блокирует пользователя"""
         async with self.async_session() as session:
@@ -141,6 +319,10 @@ class Database:
                 update(User).where(User.user_id == user_id).values(is_banned=True)
             )
             await session.commit()
+            if result.rowcount > 0:
+                self._banned.add(user_id)
+                if self.kv_store is not None:
+                    await self.kv_store.set(self._ban_key(user_id), b"1")
             return result.rowcount > 0
 
     async def unban_user(self, user_id: int) -> bool:
@@ -150,16 +332,28 @@ class Database:
                 update(User).where(User.user_id == user_id).values(is_banned=False)
             )
             await session.commit()
+            self._banned.discard(user_id)
+            if self.kv_store is not None:
+                await self.kv_store.delete(self._ban_key(user_id))
             return result.rowcount > 0
 
+    @staticmethod
+    def _ban_key(user_id: int) -> str:
+        return f"banned:{user_id}"
+
     async def is_user_banned(self, user_id: int) -> bool:
-        """Проверяет заблокирован ли пользователь"""
-        async with self.async_session() as session:
-            result = await session.execute(
-                select(User.is_banned).where(User.user_id == user_id)
-            )
-            banned = result.scalar()
-            return banned is True
+        """Проверяет заблокирован ли пользователь, без обращения к БД.
+
+        С общим хранилищем - по нему (одна команда Redis), иначе по
+        множеству в памяти.
+        """
+        if self.kv_store is not None:
+            return await self.kv_store.get(self._ban_key(user_id)) is not None
+        return self.is_banned(user_id)
+
+    def is_banned(self, user_id: int) -> bool:
+        """Проверка по множеству в памяти процесса"""
+        return user_id in self._banned
 
     async def get_all_users(self) -> list:
         """Получает список всех пользователей"""
@@ -167,32 +361,101 @@ class Database:
             result = await session.execute(select(User))
             return [user for user in result.scalars().all()]
 
+    # методы для переводов ингредиентов
+
+    async def get_translations(self) -> Dict[str, str]:
+        """Возвращает весь словарь переводов ru→en"""
+        async with self.async_session() as session:
+            result = await session.execute(select(Translation.source, Translation.target))
+            return {source: target for source, target in result.all()}
+
+    async def save_translations(self, translations: Dict[str, str]):
+        """Сохраняет переводы, не перезаписывая уже существующие"""
+        if not translations:
+            return
+        async with self.async_session() as session:
+            stmt = sqlite_insert(Translation).values(
+                [{'source': k, 'target': v} for k, v in translations.items()]
+            ).on_conflict_do_nothing(index_elements=['source'])
+            await session.execute(stmt)
+            await session.commit()
+
     # методы для статистики
     
     async def increment_stat(self, stat_name: str):
-        """Увеличивает счетчик статистики"""
+        """Увеличивает счетчик статистики на единицу"""
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        await self.add_stats(
+            {stat_name: 1},
+            [('hour', hour, stat_name, 1), ('day', hour.replace(hour=0), stat_name, 1)]
+        )
+
+    async def add_stats(self, totals: Dict[str, int], buckets: List[Tuple[str, datetime, str, int]]):
+        """Атомарно прибавляет значения к счетчикам и к почасовым/дневным корзинам.
+
+        totals - {имя счетчика: прирост}, buckets - [(period, bucket_start, name, прирост)]
+        """
+        totals = {name: n for name, n in totals.items() if name in STAT_COUNTERS and n}
         async with self.async_session() as session:
-            # Получаем или создаем запись статистики
-            result = await session.execute(select(BotStats))
-            stats = result.scalar()
-            
-            if not stats:
-                stats = BotStats()
-                session.add(stats)
-            
-            # Увеличиваем нужный счетчик
-            if hasattr(stats, stat_name):
-                current_value = getattr(stats, stat_name) or 0  # Если None, то 0
-                setattr(stats, stat_name, current_value + 1)
-                stats.last_updated = datetime.utcnow()
-                
+            if totals:
+                # UPDATE bot_stats SET x = x + :n - без чтения строки в Python
+                values = {
+                    name: func.coalesce(getattr(BotStats, name), 0) + n
+                    for name, n in totals.items()
+                }
+                values['last_updated'] = datetime.utcnow()
+                # Единственная строка с фиксированным id: одновременные сбросы
+                # (в том числе из разных воркеров) не создадут дубликатов
+                await session.execute(
+                    sqlite_insert(BotStats).values(id=BOT_STATS_ID)
+                    .on_conflict_do_nothing(index_elements=['id'])
+                )
+                await session.execute(
+                    update(BotStats).where(BotStats.id == BOT_STATS_ID).values(**values)
+                )
+
+            rows = [
+                {'period': period, 'bucket_start': start, 'name': name, 'value': n}
+                for period, start, name, n in buckets
+                if name in STAT_COUNTERS and n
+            ]
+            if rows:
+                stmt = sqlite_insert(StatBucket).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['period', 'bucket_start', 'name'],
+                    set_={'value': StatBucket.value + stmt.excluded.value}
+                )
+                await session.execute(stmt)
             await session.commit()
 
+    async def get_stat_trends(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+        """Возвращает значения счетчиков за текущий час, сегодня и вчера"""
+        now = now or datetime.utcnow()
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        today = hour.replace(hour=0)
+        yesterday = today - timedelta(days=1)
+        labels = {('hour', hour): 'hour', ('day', today): 'today', ('day', yesterday): 'yesterday'}
+
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(StatBucket.period, StatBucket.bucket_start, StatBucket.name, StatBucket.value)
+                .where(or_(
+                    and_(StatBucket.period == 'hour', StatBucket.bucket_start == hour),
+                    and_(StatBucket.period == 'day', StatBucket.bucket_start.in_([today, yesterday])),
+                ))
+            )
+            trends = {name: {'hour': 0, 'today': 0, 'yesterday': 0} for name in STAT_COUNTERS}
+            for period, start, name, value in result.all():
+                label = labels.get((period, start))
+                if label and name in trends:
+                    trends[name][label] = value
+            return trends
+
     async def get_bot_stats(self) -> Optional[Dict]:
         """Получает статистику бота"""
         async with self.async_session() as session:
             # Получаем статистику
-            result = await session.execute(select(BotStats))
+            result = await session.execute(select(BotStats).where(BotStats.id == BOT_STATS_ID))
             stats = result.scalar()
             
             # Получаем количество пользователей
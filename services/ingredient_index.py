@@ -0,0 +1,115 @@
+import logging
+from dataclasses import replace
+from typing import Dict, Iterable, List, Set, Tuple
+from services.recipes import RecipeRecord
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_ingredient(name: str) -> str:
+    """Приводит название ингредиента к ключу индекса: "Tomatoes" -> "tomato" """
+    words = []
+    for word in name.lower().replace('-', ' ').split():
+        if len(word) > 3 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 3 and word.endswith('oes'):
+            word = word[:-2]
+        elif len(word) > 2 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return ' '.join(words)
+
+
+def _index_keys(name: str) -> Set[str]:
+    # Ингредиент находится и по полному названию, и по каждому слову:
+    # запрос "chicken" находит рецепт с "chicken breast"
+    key = normalize_ingredient(name)
+    return {key, *key.split()} if key else set()
+
+
+class IngredientIndex:
+    """Инвертированный индекс ингредиент -> рецепты по ответам findByIngredients.
+
+    Для каждого рецепта хранятся ключи всех его ингредиентов
+    (usedIngredients + missedIngredients), поэтому для любого набора
+    ингредиентов можно посчитать, сколько из них рецепт использует и
+    скольких ему не хватает, не обращаясь к API.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        self._recipes: Dict[int, RecipeRecord] = {}
+        # id рецепта -> (ключи ингредиентов, всего ингредиентов)
+        self._ingredients: Dict[int, Tuple[Set[str], int]] = {}
+        self.responses = 0
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def add(self, results: Iterable[dict]) -> int:
+        """Добавляет рецепты из ответа findByIngredients. Возвращает количество новых"""
+        added = 0
+        for item in results:
+            record = RecipeRecord.from_api(item) if isinstance(item, dict) else None
+            if record is None:
+                continue
+            names = [
+                ingredient.get('name') or ''
+                for field in ('usedIngredients', 'missedIngredients')
+                for ingredient in item.get(field) or ()
+            ]
+            keys = set().union(*(_index_keys(name) for name in names)) if names else set()
+            if not keys:
+                continue
+            if record.id not in self._recipes:
+                added += 1
+            self._recipes[record.id] = replace(record, used_ingredient_count=None,
+                                               missed_ingredient_count=None)
+            self._ingredients[record.id] = (keys, len(set(names)))
+            for key in keys:
+                self._postings.setdefault(key, set()).add(record.id)
+        self.responses += 1
+        return added
+
+    def search(self, ingredients: Iterable[str], number: int = 5) -> List[RecipeRecord]:
+        """Лучшие рецепты для набора ингредиентов или [], если их меньше number.
+
+        Подходящими считаются рецепты, в которых есть все запрошенные
+        ингредиенты; выше те, кому не хватает меньше остальных (как ranking=2
+        в Spoonacular).
+        """
+        keys = [normalize_ingredient(name) for name in ingredients]
+        keys = [key for key in dict.fromkeys(keys) if key]
+        if not keys:
+            return []
+        postings = [self._postings.get(key, set()) for key in keys]
+        candidates = set.intersection(*postings)
+        if len(candidates) < number:
+            return []
+
+        # Все кандидаты используют все запрошенные ингредиенты
+        used = len(keys)
+        ranked = sorted(
+            (max(self._ingredients[recipe_id][1] - used, 0), recipe_id)
+            for recipe_id in candidates
+        )
+        return [
+            replace(self._recipes[recipe_id], used_ingredient_count=used,
+                    missed_ingredient_count=missed)
+            for missed, recipe_id in ranked[:number]
+        ]
+
+    async def load(self, cache) -> int:
+        """Строит индекс по всем закэшированным ответам findByIngredients"""
+        responses = 0
+        async for _, data in cache.scan():
+            if isinstance(data, list) and data and isinstance(data[0], dict) \
+                    and 'usedIngredients' in data[0]:
+                try:
+                    self.add(data)
+                except Exception as e:
+                    logger.error(f"Ingredient index: skipping cached response: {e}")
+                    continue
+                responses += 1
+        logger.info(f"Ingredient index loaded: {len(self)} recipes from {responses} cached responses")
+        return responses
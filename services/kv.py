@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from aiogram.fsm.storage.memory import MemoryStorage
+from config.settings import settings
+from services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class LockTimeout(Exception):
+    """Не удалось взять распределенную блокировку за отведенное время"""
+
+
+class KeyValueStore:
+    """Общее для нескольких процессов бота хранилище ключ-значение.
+
+    Интерфейс - небольшое подмножество команд Redis. Реализации:
+    ``RedisKeyValueStore`` для работы нескольких воркеров и
+    ``MemoryKeyValueStore`` - замена внутри процесса для тестов и разработки.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None,
+                  nx: bool = False) -> bool:
+        """Записывает значение. С nx=True - только если ключа еще нет"""
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> int:
+        raise NotImplementedError
+
+    async def delete_if_equals(self, key: str, value: bytes) -> bool:
+        """Атомарно удаляет ключ, если он хранит value"""
+        raise NotImplementedError
+
+    async def keys(self, prefix: str) -> List[str]:
+        raise NotImplementedError
+
+    async def take_token(self, key: str, rate: float, capacity: float,
+                         amount: float = 1, ttl: float = 300) -> Tuple[bool, bool]:
+        """Атомарно списывает токены из token bucket'а key.
+
+        Возвращает (разрешено, нужно предупредить): второй флаг равен True
+        только для первого отказа после разрешенного запроса.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    @asynccontextmanager
+    async def lock(self, name: str, timeout: Optional[float] = None,
+                   blocking_timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Распределенная блокировка на SET NX с автоматическим истечением.
+
+        ``timeout`` - сколько живет блокировка, если владелец упал,
+        ``blocking_timeout`` - сколько ждать освобождения (LockTimeout).
+        """
+        timeout = timeout if timeout is not None else settings.kv_lock_timeout
+        blocking_timeout = blocking_timeout if blocking_timeout is not None else timeout
+        key = f"lock:{name}"
+        token = secrets.token_hex(16).encode()
+        deadline = time.monotonic() + blocking_timeout
+        delay = 0.01
+        while not await self.set(key, token, ttl=timeout, nx=True):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(name)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        try:
+            yield
+        finally:
+            # Блокировка могла истечь и достаться другому - удаляем только свою
+            await self.delete_if_equals(key, token)
+
+
+class MemoryKeyValueStore(KeyValueStore):
+    """Хранилище в памяти процесса с той же семантикой, что у Redis"""
+
+    def __init__(self):
+        # key -> (значение, момент истечения или None)
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _alive(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._alive(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None,
+                  nx: bool = False) -> bool:
+        if nx and self._alive(key) is not None:
+            return False
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def delete_if_equals(self, key: str, value: bytes) -> bool:
+        if self._alive(key) != value:
+            return False
+        del self._data[key]
+        return True
+
+    async def keys(self, prefix: str) -> List[str]:
+        return [key for key in list(self._data) if key.startswith(prefix) and self._alive(key) is not None]
+
+    async def take_token(self, key: str, rate: float, capacity: float,
+                         amount: float = 1, ttl: float = 300) -> Tuple[bool, bool]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None or now - bucket.updated > ttl:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity, now)
+        if bucket.consume(amount, now):
+            bucket.warned = False
+            return True, False
+        notify = not bucket.warned
+        bucket.warned = True
+        return False, notify
+
+
+# Token bucket в hash: tokens, ts, warned. Время берется с сервера Redis,
+# чтобы расхождение часов воркеров не влияло на лимиты
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'warned')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+local warned = tonumber(state[3]) or 0
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local notify = 0
+if tokens >= amount then
+  tokens = tokens - amount
+  allowed = 1
+  warned = 0
+elseif warned == 0 then
+  notify = 1
+  warned = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now, 'warned', warned)
+redis.call('EXPIRE', KEYS[1], math.ceil(ttl))
+return {allowed, notify}
+"""
+
+DELETE_IF_EQUALS_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisKeyValueStore(KeyValueStore):
+    """Хранилище в Redis (или совместимом сервере). Требует пакет redis"""
+
+    def __init__(self, client, prefix: str = "recipebot:"):
+        self.client = client
+        self.prefix = prefix
+        self._take_token = client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._delete_if_equals = client.register_script(DELETE_IF_EQUALS_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisKeyValueStore":
+        # Необязательная зависимость - импортируем только при использовании
+        from redis.asyncio import Redis
+        return cls(Redis.from_url(url), **kwargs)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None,
+                  nx: bool = False) -> bool:
+        px = int(ttl * 1000) if ttl else None
+        return bool(await self.client.set(self.prefix + key, value, px=px, nx=nx))
+
+    async def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def delete_if_equals(self, key: str, value: bytes) -> bool:
+        return bool(await self._delete_if_equals(keys=[self.prefix + key], args=[value]))
+
+    async def keys(self, prefix: str) -> List[str]:
+        # Экранируем спецсимволы glob в префиксе
+        match = "".join(f"[{c}]" if c in "*?[]\\" else c for c in self.prefix + prefix) + "*"
+        start = len(self.prefix)
+        return [key.decode()[start:] async for key in self.client.scan_iter(match=match, count=500)]
+
+    async def take_token(self, key: str, rate: float, capacity: float,
+                         amount: float = 1, ttl: float = 300) -> Tuple[bool, bool]:
+        allowed, notify = await self._take_token(
+            keys=[self.prefix + key], args=[rate, capacity, amount, ttl]
+        )
+        return bool(allowed), bool(notify)
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_store(url: Optional[str] = None) -> Optional[KeyValueStore]:
+    """Хранилище по настройке redis_url: "" - нет общего хранилища,
+    "memory://" - MemoryKeyValueStore, иначе Redis по URL"""
+    url = url if url is not None else settings.redis_url
+    if not url:
+        return None
+    if url == "memory://":
+        return MemoryKeyValueStore()
+    logger.info("Using Redis key-value store")
+    return RedisKeyValueStore.from_url(url)
+
+
+def create_fsm_storage(store: Optional[KeyValueStore]):
+    """FSM-хранилище aiogram: в Redis, если он настроен, иначе в памяти"""
+    if isinstance(store, RedisKeyValueStore):
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage(store.client)
+    return MemoryStorage()
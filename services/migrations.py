@@ -0,0 +1,109 @@
+from datetime import datetime
+from sqlalchemy.engine import Connection
+from models import Favorite
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Миграции для уже существующей базы. create_all создает только
+# отсутствующие таблицы, поэтому изменения схемы старых таблиц
+# описываются здесь. Каждая миграция применяется один раз.
+
+
+def _favorites_unique_index(conn: Connection):
+    # Убираем дубликаты, которые могли накопиться без ограничения
+    conn.exec_driver_sql(
+        "DELETE FROM favorites WHERE id NOT IN "
+        "(SELECT MIN(id) FROM favorites GROUP BY user_id, recipe_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_favorites_user_recipe "
+        "ON favorites (user_id, recipe_id)"
+    )
+
+
+def _favorites_reference_recipes(conn: Connection):
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(favorites)")}
+    if 'title' not in columns:
+        # База создана уже с новой схемой
+        return
+    # Переносим данные рецептов (последнюю сохраненную версию) в recipes
+    conn.exec_driver_sql(
+        "INSERT OR IGNORE INTO recipes (id, title, image, source_url, updated_at) "
+        "SELECT recipe_id, title, image, source_url, ? FROM favorites "
+        "WHERE id IN (SELECT MAX(id) FROM favorites GROUP BY recipe_id)",
+        (str(datetime.utcnow()),)
+    )
+    # SQLite не умеет удалять столбцы со ссылками - пересоздаем таблицу
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_favorites_user_recipe")
+    conn.exec_driver_sql("ALTER TABLE favorites RENAME TO favorites_old")
+    Favorite.__table__.create(conn)
+    conn.exec_driver_sql(
+        "INSERT INTO favorites (id, user_id, recipe_id) "
+        "SELECT id, user_id, recipe_id FROM favorites_old"
+    )
+    conn.exec_driver_sql("DROP TABLE favorites_old")
+
+
+def _recipes_fts(conn: Connection):
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(recipes)")}
+    if 'ingredients' not in columns:
+        conn.exec_driver_sql("ALTER TABLE recipes ADD COLUMN ingredients VARCHAR")
+    # Полнотекстовый индекс по каталогу рецептов; содержимое берется из
+    # recipes (external content), триггеры поддерживают его в актуальном виде
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5("
+        "title, ingredients, diets, content='recipes', content_rowid='id', "
+        "tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS recipes_fts_ai AFTER INSERT ON recipes BEGIN "
+        "INSERT INTO recipes_fts (rowid, title, ingredients, diets) "
+        "VALUES (new.id, new.title, new.ingredients, new.diets); END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS recipes_fts_ad AFTER DELETE ON recipes BEGIN "
+        "INSERT INTO recipes_fts (recipes_fts, rowid, title, ingredients, diets) "
+        "VALUES ('delete', old.id, old.title, old.ingredients, old.diets); END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS recipes_fts_au AFTER UPDATE ON recipes BEGIN "
+        "INSERT INTO recipes_fts (recipes_fts, rowid, title, ingredients, diets) "
+        "VALUES ('delete', old.id, old.title, old.ingredients, old.diets); "
+        "INSERT INTO recipes_fts (rowid, title, ingredients, diets) "
+        "VALUES (new.id, new.title, new.ingredients, new.diets); END"
+    )
+    conn.exec_driver_sql("INSERT INTO recipes_fts (recipes_fts) VALUES ('rebuild')")
+
+
+def _bot_stats_single_row(conn: Connection):
+    # Параллельные сбросы счетчиков могли создать несколько строк, которые
+    # затем увеличивались одинаково - оставляем первую и даем ей id = 1
+    conn.exec_driver_sql("DELETE FROM bot_stats WHERE id <> (SELECT MIN(id) FROM bot_stats)")
+    conn.exec_driver_sql("UPDATE bot_stats SET id = 1")
+
+
+MIGRATIONS = [
+    ("0001_favorites_unique_index", _favorites_unique_index),
+    ("0002_favorites_reference_recipes", _favorites_reference_recipes),
+    ("0003_recipes_fts", _recipes_fts),
+    ("0004_bot_stats_single_row", _bot_stats_single_row),
+]
+
+
+def apply_migrations(conn: Connection):
+    """Применяет еще не примененные миграции (вызывается через run_sync)"""
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations "
+        "(name VARCHAR PRIMARY KEY, applied_at DATETIME)"
+    )
+    applied = {row[0] for row in conn.exec_driver_sql("SELECT name FROM schema_migrations")}
+    for name, migrate in MIGRATIONS:
+        if name in applied:
+            continue
+        logger.info(f"Applying migration {name}")
+        migrate(conn)
+        conn.exec_driver_sql(
+            "INSERT INTO schema_migrations (name, applied_at) VALUES (?, ?)",
+            (name, datetime.utcnow().isoformat())
+        )
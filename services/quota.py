@@ -0,0 +1,109 @@
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class QuotaTracker:
+    """Учет баллов квоты Spoonacular по заголовкам X-API-Quota-*.
+
+    ``X-API-Quota-Request`` - стоимость запроса, ``X-API-Quota-Used`` -
+    израсходовано за день, ``X-API-Quota-Left`` - остаток.
+    """
+
+    def __init__(self):
+        self.used: Optional[float] = None
+        self.left: Optional[float] = None
+        self.endpoints: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {'requests': 0, 'points': 0.0, 'errors': 0, 'retries': 0}
+        )
+
+    def record(self, endpoint: str, headers: Mapping[str, str]):
+        stats = self.endpoints[endpoint]
+        stats['requests'] += 1
+        cost = _header_float(headers, 'X-API-Quota-Request')
+        if cost is not None:
+            stats['points'] += cost
+        used = _header_float(headers, 'X-API-Quota-Used')
+        if used is not None:
+            self.used = used
+        left = _header_float(headers, 'X-API-Quota-Left')
+        if left is not None:
+            self.left = left
+
+    def record_error(self, endpoint: str):
+        self.endpoints[endpoint]['errors'] += 1
+
+    def record_retry(self, endpoint: str):
+        self.endpoints[endpoint]['retries'] += 1
+
+    def spent(self) -> float:
+        """Баллов израсходовано с запуска. Если API не сообщило стоимость
+        запроса, он считается за 1 балл (минимальная цена у Spoonacular)"""
+        return sum(max(values['points'], values['requests']) for values in self.endpoints.values())
+
+    @property
+    def exhausted(self) -> bool:
+        return self.left is not None and self.left <= 0
+
+    def stats(self) -> dict:
+        return {
+            'used': self.used,
+            'left': self.left,
+            'endpoints': {name: dict(values) for name, values in self.endpoints.items()},
+        }
+
+
+class CircuitBreaker:
+    """Размыкается после ``failure_threshold`` неудач подряд.
+
+    В разомкнутом состоянии запросы не выполняются ``reset_timeout`` секунд,
+    затем пропускается один пробный запрос (half-open): успех замыкает
+    цепь, неудача снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.opened_until
+
+    def allow(self) -> bool:
+        if self.failures < self.failure_threshold:
+            return True
+        if self.is_open or self._probe_in_flight:
+            return False
+        # Полуоткрытое состояние: пропускаем один пробный запрос
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.failures >= self.failure_threshold:
+            self.open_for(self.reset_timeout)
+
+    def open_for(self, seconds: float):
+        self.failures = max(self.failures, self.failure_threshold)
+        self._probe_in_flight = False
+        self.opened_until = max(self.opened_until, time.monotonic() + seconds)
+        logger.warning(f"Spoonacular circuit opened for {seconds:.0f}s")
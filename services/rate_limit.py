@@ -0,0 +1,107 @@
+import asyncio
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class TokenBucket:
+    """Классический token bucket: ``rate`` токенов в секунду, не больше ``capacity``"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'warned')
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+        # Пользователь уже предупрежден о превышении лимита
+        self.warned = False
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def consume(self, amount: float = 1, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    async def acquire(self, amount: float = 1):
+        """Ждет, пока в бакете появятся токены, и списывает их"""
+        while not self.consume(amount):
+            await asyncio.sleep(self.retry_after(amount))
+
+    def retry_after(self, amount: float = 1) -> float:
+        """Через сколько секунд будет доступно amount токенов"""
+        missing = amount - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    """Набор token bucket'ов по ключу (пользователь, чат и т.п.).
+
+    Бакеты, к которым не обращались дольше ``idle_ttl`` секунд, удаляются:
+    за это время они все равно наполнились бы до конца.
+    """
+
+    def __init__(self, rate: float, burst: float, idle_ttl: float = 300):
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = max(idle_ttl, burst / rate if rate > 0 else idle_ttl)
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key: Hashable, amount: float = 1) -> Tuple[bool, TokenBucket]:
+        """Пытается списать токены. Возвращает (разрешено, бакет)"""
+        now = time.monotonic()
+        if now - self._last_sweep > self.idle_ttl:
+            self._sweep(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+        return bucket.consume(amount, now), bucket
+
+    async def hit(self, key: Hashable, amount: float = 1) -> Tuple[bool, bool]:
+        """Как take, но возвращает (разрешено, нужно предупредить) - флаг
+        предупреждения поднимается только при первом отказе подряд"""
+        allowed, bucket = self.take(key, amount)
+        if allowed:
+            bucket.warned = False
+            return True, False
+        notify = not bucket.warned
+        bucket.warned = True
+        return False, notify
+
+    def _sweep(self, now: float):
+        deadline = now - self.idle_ttl
+        for key in [k for k, b in self._buckets.items() if b.updated < deadline]:
+            del self._buckets[key]
+        self._last_sweep = now
+
+
+class SharedRateLimiter:
+    """RateLimiter, чьи бакеты лежат в общем KeyValueStore.
+
+    Лимиты действуют на все процессы бота сразу; интерфейс ``hit``
+    совпадает с ``RateLimiter.hit``.
+    """
+
+    def __init__(self, store, name: str, rate: float, burst: float, idle_ttl: float = 300):
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = max(idle_ttl, burst / rate if rate > 0 else idle_ttl)
+
+    async def hit(self, key: Hashable, amount: float = 1) -> Tuple[bool, bool]:
+        if isinstance(key, tuple):
+            key = ":".join(map(str, key))
+        return await self.store.take_token(
+            f"throttle:{self.name}:{key}", self.rate, self.burst, amount, self.idle_ttl
+        )
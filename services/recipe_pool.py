@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+from config.settings import settings
+from services.cache import make_cache_key
+from services.recipes import RecipeRecord
+
+logger = logging.getLogger(__name__)
+
+
+class RecipePool:
+    """Пул заранее загруженных случайных рецептов для каждой диеты.
+
+    Рецепты запрашиваются у API пачками по ``high_watermark`` штук. Когда
+    в пуле остается меньше ``low_watermark`` рецептов, в фоне запускается
+    пополнение, поэтому ``/random`` обычно отвечает сразу и каждый
+    пользователь получает свой рецепт. Содержимое пулов сохраняется
+    в кэш ответов при остановке и восстанавливается при старте.
+    """
+
+    def __init__(self, api, low_watermark: Optional[int] = None,
+                 high_watermark: Optional[int] = None):
+        self.api = api
+        self.low_watermark = low_watermark if low_watermark is not None else settings.recipe_pool_low
+        self.high_watermark = high_watermark if high_watermark is not None else settings.recipe_pool_high
+        self._pools: Dict[str, Deque[RecipeRecord]] = {}
+        self._refills: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _cache_key(diet: str) -> str:
+        # v2: пулы хранятся как RecipeRecord.to_dict()
+        return make_cache_key("recipe_pool:v2", {"diet": diet})
+
+    def size(self, diet: str = "") -> int:
+        return len(self._pools.get(diet, ()))
+
+    async def load(self, diets):
+        """Восстанавливает сохраненные пулы из кэша"""
+        for diet in diets:
+            try:
+                recipes = await self.api.cache.get(self._cache_key(diet))
+                if recipes:
+                    self._pools[diet] = deque(RecipeRecord.from_dict(recipe) for recipe in recipes)
+            except Exception as e:
+                logger.error(f"Recipe pool load error: {e}")
+                continue
+            if recipes:
+                logger.info(f"Loaded {len(recipes)} pooled recipes for diet '{diet}'")
+
+    async def close(self):
+        """Останавливает пополнение и сохраняет пулы в кэш"""
+        tasks = list(self._refills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for diet, pool in self._pools.items():
+            try:
+                await self.api.cache.set(self._cache_key(diet), [recipe.to_dict() for recipe in pool])
+            except Exception as e:
+                logger.error(f"Recipe pool save error: {e}")
+
+    async def get(self, diet: str = "") -> Optional[RecipeRecord]:
+        """Выдает рецепт из пула. Ждет API, только если пул пуст"""
+        pool = self._pools.setdefault(diet, deque())
+        if not pool:
+            await self.refill(diet)
+            if not pool:
+                # API недоступен - второе пополнение в фоне тоже ничего не даст
+                return None
+        recipe = pool.popleft()
+        if len(pool) < self.low_watermark:
+            self.refill(diet)
+        return recipe
+
+    def refill(self, diet: str = "") -> asyncio.Task:
+        """Запускает пополнение пула (не больше одного на диету одновременно)"""
+        task = self._refills.get(diet)
+        if task is None or task.done():
+            task = asyncio.create_task(self._refill(diet))
+            self._refills[diet] = task
+        return task
+
+    async def _refill(self, diet: str):
+        pool = self._pools.setdefault(diet, deque())
+        need = self.high_watermark - len(pool)
+        if need <= 0:
+            return
+        # Spoonacular отдает не больше 100 рецептов за запрос
+        recipes = await self.api.get_random_recipes(diet, number=min(need, 100))
+        known = {recipe.id for recipe in pool}
+        added = 0
+        for recipe in recipes:
+            if recipe.id in known:
+                continue
+            known.add(recipe.id)
+            pool.append(recipe)
+            added += 1
+        logger.info(f"Recipe pool '{diet}' refilled with {added} recipes, size {len(pool)}")
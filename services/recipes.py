@@ -0,0 +1,91 @@
+from dataclasses import asdict, dataclass, fields
+from typing import Optional, Tuple
+
+
+@dataclass(slots=True)
+class RecipeRecord:
+    """Компактное представление рецепта из ответа Spoonacular.
+
+    Ответы разных эндпоинтов приводятся к одному виду в ``from_api``;
+    в БД (таблица ``recipes``) сохраняются поля из ``to_row``.
+    ``used_ingredient_count`` и ``missed_ingredient_count`` есть только у
+    результатов поиска по ингредиентам.
+    """
+    id: int
+    title: str
+    image: Optional[str] = None
+    source_url: Optional[str] = None
+    ready_in_minutes: Optional[int] = None
+    servings: Optional[int] = None
+    diets: Tuple[str, ...] = ()
+    ingredients: Tuple[str, ...] = ()
+    used_ingredient_count: Optional[int] = None
+    missed_ingredient_count: Optional[int] = None
+
+    @classmethod
+    def from_api(cls, data: dict) -> Optional["RecipeRecord"]:
+        """Создает запись из рецепта в формате API. None, если нет id или названия"""
+        if not data.get('id') or not data.get('title'):
+            return None
+        source_url = data.get('sourceUrl')
+        if not source_url:
+            # findByIngredients не отдает ссылку - строим ссылку на страницу рецепта
+            source_url = f"https://spoonacular.com/recipes/{data['title'].replace(' ', '-')}-{data['id']}"
+        # У /recipes/random - extendedIngredients, у findByIngredients -
+        # использованные и недостающие ингредиенты
+        ingredients = [
+            item.get('name') for field in ('extendedIngredients', 'usedIngredients', 'missedIngredients')
+            for item in data.get(field) or () if item.get('name')
+        ]
+        return cls(
+            id=int(data['id']),
+            title=data['title'],
+            image=data.get('image'),
+            source_url=source_url,
+            ready_in_minutes=data.get('readyInMinutes'),
+            servings=data.get('servings'),
+            diets=tuple(data.get('diets') or ()),
+            ingredients=tuple(dict.fromkeys(ingredients)),
+            used_ingredient_count=data.get('usedIngredientCount'),
+            missed_ingredient_count=data.get('missedIngredientCount'),
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RecipeRecord":
+        """Обратное к ``to_dict`` преобразование"""
+        names = {f.name for f in fields(cls)}
+        values = {k: v for k, v in data.items() if k in names}
+        values['diets'] = tuple(values.get('diets') or ())
+        values['ingredients'] = tuple(values.get('ingredients') or ())
+        return cls(**values)
+
+    @classmethod
+    def from_row(cls, row) -> "RecipeRecord":
+        """Обратное к ``to_row`` преобразование (строка таблицы recipes)"""
+        return cls(
+            id=row['id'],
+            title=row['title'],
+            image=row['image'],
+            source_url=row['source_url'],
+            ready_in_minutes=row['ready_in_minutes'],
+            servings=row['servings'],
+            diets=tuple(row['diets'].split(',')) if row['diets'] else (),
+            ingredients=tuple(row['ingredients'].split(', ')) if row['ingredients'] else (),
+        )
+
+    def to_dict(self) -> dict:
+        """Словарь для сохранения в кэш (JSON)"""
+        return asdict(self)
+
+    def to_row(self) -> dict:
+        """Поля для таблицы recipes"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'image': self.image,
+            'source_url': self.source_url,
+            'ready_in_minutes': self.ready_in_minutes,
+            'servings': self.servings,
+            'diets': ','.join(self.diets) or None,
+            'ingredients': ', '.join(self.ingredients) or None,
+        }
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from config.settings import settings
+from services.rate_limit import RateLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class MessageSender:
+    """Исходящие сообщения с учетом лимитов Telegram.
+
+    Общий лимит бота (~30 сообщений в секунду) и лимит на чат (около
+    1 сообщения в секунду в личке и 20 в минуту в группе) соблюдаются
+    token bucket'ами. Сообщения в один чат уходят строго по порядку,
+    разные чаты друг друга не ждут. На ``RetryAfter`` отправка
+    повторяется после указанной Telegram паузы.
+    """
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.global_bucket = TokenBucket(settings.send_global_rate, settings.send_global_rate)
+        self.private_limiter = RateLimiter(settings.send_chat_rate, settings.send_chat_burst)
+        self.group_limiter = RateLimiter(settings.send_group_rate, settings.send_chat_burst)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_users: Dict[int, int] = defaultdict(int)
+
+    async def _acquire(self, chat_id: int):
+        # Отрицательные id - группы и каналы
+        limiter = self.group_limiter if chat_id < 0 else self.private_limiter
+        while True:
+            allowed, bucket = limiter.take(chat_id)
+            if allowed:
+                break
+            await asyncio.sleep(bucket.retry_after())
+        await self.global_bucket.acquire()
+
+    async def _send(self, chat_id: int, text: str, **kwargs):
+        for attempt in range(settings.send_max_retries + 1):
+            await self._acquire(chat_id)
+            try:
+                return await self.bot.send_message(chat_id, text, **kwargs)
+            except TelegramRetryAfter as e:
+                if attempt == settings.send_max_retries:
+                    raise
+                logger.warning(f"Flood control for chat {chat_id}, retry in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+
+    async def send(self, chat_id: int, text: str, **kwargs):
+        """Отправляет одно сообщение"""
+        return await self.send_many(chat_id, [(text, kwargs)])
+
+    async def send_many(self, chat_id: int, messages: List[Tuple[str, dict]]):
+        """Отправляет сообщения в чат по порядку. Возвращает последнее отправленное"""
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        self._chat_users[chat_id] += 1
+        result = None
+        try:
+            async with lock:
+                for text, kwargs in messages:
+                    result = await self._send(chat_id, text, **kwargs)
+        finally:
+            # Не держим блокировки для неактивных чатов
+            self._chat_users[chat_id] -= 1
+            if not self._chat_users[chat_id]:
+                del self._chat_users[chat_id]
+                del self._chat_locks[chat_id]
+        return result
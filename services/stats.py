@@ -0,0 +1,50 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from config.settings import settings
+from services.background import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCounter(PeriodicFlusher):
+    """Счетчики статистики, агрегируемые в памяти.
+
+    ``incr`` не обращается к БД: приросты копятся по часам и раз в
+    интервал записываются атомарными ``UPDATE bot_stats SET x = x + :n``
+    и upsert'ами в почасовые/дневные корзины ``stat_buckets``.
+    """
+
+    def __init__(self, db, interval: Optional[float] = None):
+        super().__init__(interval if interval is not None else settings.stats_flush_interval)
+        self.db = db
+        # (имя счетчика, начало часа) -> прирост
+        self._pending: Dict[Tuple[str, datetime], int] = defaultdict(int)
+
+    def incr(self, name: str, n: int = 1):
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        self._pending[(name, hour)] += n
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, defaultdict(int)
+
+        totals: Dict[str, int] = defaultdict(int)
+        buckets: Dict[Tuple[str, datetime, str], int] = defaultdict(int)
+        for (name, hour), n in pending.items():
+            totals[name] += n
+            buckets[('hour', hour, name)] += n
+            buckets[('day', hour.replace(hour=0), name)] += n
+
+        try:
+            await self.db.add_stats(
+                dict(totals),
+                [(period, start, name, n) for (period, start, name), n in buckets.items()]
+            )
+        except Exception:
+            # Не теряем приросты: вернем их в буфер до следующей попытки
+            for key, n in pending.items():
+                self._pending[key] += n
+            raise
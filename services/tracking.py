@@ -0,0 +1,67 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from config.settings import settings
+from services.background import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+
+class UserActivityTracker(PeriodicFlusher):
+    """Буфер изменений профилей и активности пользователей (write-behind).
+
+    Вместо транзакции на каждый апдейт изменения копятся в памяти и
+    пачкой записываются через ``INSERT ... ON CONFLICT`` раз в интервал
+    или при накоплении ``max_pending`` пользователей. Если профиль не
+    изменился и активность уже записана не раньше ``activity_resolution``
+    назад, апдейт вообще не порождает записи.
+    """
+
+    def __init__(self, db, interval: Optional[float] = None,
+                 max_pending: Optional[int] = None,
+                 activity_resolution: Optional[float] = None):
+        super().__init__(interval if interval is not None else settings.user_flush_interval)
+        self.db = db
+        self.max_pending = max_pending if max_pending is not None else settings.user_flush_max_pending
+        self.activity_resolution = timedelta(
+            seconds=activity_resolution if activity_resolution is not None
+            else settings.user_activity_resolution
+        )
+        self._pending: Dict[int, dict] = {}
+        # user_id -> (профиль, время последней записанной активности)
+        self._written: Dict[int, Tuple[tuple, datetime]] = {}
+
+    def touch(self, user_data: dict):
+        """Отмечает активность пользователя"""
+        user_id = user_data['user_id']
+        now = datetime.utcnow()
+        profile = (user_data.get('username'), user_data.get('first_name'), user_data.get('last_name'))
+
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            pending.update(user_data, last_activity=now)
+            return
+
+        written = self._written.get(user_id)
+        if written and written[0] == profile and now - written[1] < self.activity_resolution:
+            return
+
+        self._pending[user_id] = {**user_data, 'last_activity': now}
+        if len(self._pending) >= self.max_pending:
+            self.request_flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = list(self._pending.values()), {}
+        try:
+            await self.db.upsert_users(rows)
+        except Exception:
+            # Возвращаем несохраненное в буфер, более новые данные важнее
+            for row in rows:
+                self._pending.setdefault(row['user_id'], row)
+            raise
+        for row in rows:
+            profile = (row.get('username'), row.get('first_name'), row.get('last_name'))
+            self._written[row['user_id']] = (profile, row['last_activity'])
+        logger.debug(f"Flushed activity of {len(rows)} users")
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from googletrans import Translator
+from keyboards.inline import POPULAR_INGREDIENTS
+
+logger = logging.getLogger(__name__)
+
+# Заранее известные переводы для кнопок ingredients_keyboard,
+# чтобы популярные ингредиенты никогда не ходили в переводчик
+PRESET_TRANSLATIONS: Dict[str, str] = {
+    "яйца": "eggs",
+    "молоко": "milk",
+    "мука": "flour",
+    "курица": "chicken",
+    "рис": "rice",
+    "картофель": "potatoes",
+    "помидоры": "tomatoes",
+    "сыр": "cheese",
+    "лук": "onion",
+}
+
+_CYRILLIC = re.compile(r'[а-яё]', re.IGNORECASE)
+
+
+class IngredientTranslator:
+    """Переводчик ингредиентов ru→en с постоянным кэшем.
+
+    Словарь переводов хранится в таблице ``translations`` и целиком
+    держится в памяти. googletrans синхронный, поэтому вызов переводчика
+    выполняется в отдельном потоке и не блокирует event loop.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self.cache: Dict[str, str] = {}
+        self._translator = Translator()
+        # googletrans не потокобезопасен - используем один рабочий поток
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="translator")
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._seed_presets()
+
+    def _seed_presets(self):
+        missing = [item for item in POPULAR_INGREDIENTS if item not in PRESET_TRANSLATIONS]
+        if missing:
+            logger.warning(f"No preset translation for: {', '.join(missing)}")
+        self.cache.update(PRESET_TRANSLATIONS)
+
+    async def load(self):
+        """Загружает сохраненные переводы из БД и дописывает туда предустановленные"""
+        if self.db is None:
+            return
+        await self.db.save_translations(PRESET_TRANSLATIONS)
+        self.cache.update(await self.db.get_translations())
+        logger.info(f"Loaded {len(self.cache)} ingredient translations")
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return ' '.join(text.lower().split())
+
+    def get_cached(self, text: str) -> Optional[str]:
+        """Возвращает перевод из кэша без обращения к переводчику"""
+        key = self._normalize(text)
+        if not _CYRILLIC.search(key):
+            return key
+        return self.cache.get(key)
+
+    async def translate(self, text: str) -> str:
+        """Переводит ингредиент на английский. При ошибке возвращает исходный текст"""
+        key = self._normalize(text)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return cached
+
+        # Одинаковые слова, запрошенные одновременно, переводятся один раз
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._translate_remote(key))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def translate_query(self, text: str) -> str:
+        """Переводит поисковый запрос, ничего не сохраняя в словарь.
+
+        Слова переводятся по словарю ингредиентов; переводчик вызывается,
+        только если какое-то слово в словаре не найдено. Если переводчик
+        недоступен, возвращаются слова, которые удалось перевести по словарю.
+        """
+        words = self._normalize(text).split()
+        cached = [self.get_cached(word) for word in words]
+        if all(word is not None for word in cached):
+            return ' '.join(cached)
+        translated = await self._translate_remote(' '.join(words), persist=False)
+        if translated != ' '.join(words):
+            return translated
+        return ' '.join(word for word in cached if word is not None)
+
+    async def _translate_remote(self, key: str, persist: bool = True) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._executor,
+                lambda: self._translator.translate(key, src='ru', dest='en')
+            )
+            translated = result.text.lower()
+            logger.info(f"Переведённый ингредиент: {key} → {translated}")
+        except Exception as e:
+            logger.warning(f"Ошибка перевода '{key}': {e}")
+            return key
+
+        if not persist:
+            return translated
+        self.cache[key] = translated
+        if self.db is not None:
+            try:
+                await self.db.save_translations({key: translated})
+            except Exception as e:
+                logger.error(f"Translation save error: {e}")
+        return translated
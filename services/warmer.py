@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from typing import Iterable, Optional
+from config.settings import settings
+from services.kv import KeyValueStore, LockTimeout
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    """Прогревает кэш для фиксированных кнопок: ингредиентов и диет.
+
+    При запуске и затем раз в ``interval`` секунд загружает переводы
+    ингредиентов, результаты findByIngredients (вместе с деталями рецептов)
+    и пулы случайных рецептов. Уже свежие данные берутся из кэша и квоту не
+    тратят; как только израсходовано ``budget`` баллов квоты, прогрев
+    останавливается до следующего запуска. С общим хранилищем прогревает
+    только один воркер.
+    """
+
+    def __init__(self, api, recipe_pool, ingredients: Iterable[str], diets: Iterable[str],
+                 kv_store: Optional[KeyValueStore] = None,
+                 budget: Optional[float] = None, interval: Optional[float] = None):
+        self.api = api
+        self.recipe_pool = recipe_pool
+        self.ingredients = list(ingredients)
+        self.diets = list(diets)
+        self.kv_store = kv_store
+        self.budget = budget if budget is not None else settings.warm_quota_budget
+        self.interval = interval if interval is not None else settings.warm_interval
+        self._task: Optional[asyncio.Task] = None
+        self._first_pass = asyncio.Event()
+
+    async def start(self, wait: Optional[float] = None):
+        """Запускает прогрев и ждет первого прохода не дольше wait секунд"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+        wait = wait if wait is not None else settings.warm_startup_timeout
+        try:
+            await asyncio.wait_for(self._first_pass.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            logger.warning("Cache warm-up is still running, continuing startup")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.warm_once()
+            except Exception as e:
+                logger.error(f"Cache warm-up error: {e}", exc_info=True)
+            self._first_pass.set()
+            await asyncio.sleep(self.interval)
+
+    async def warm_once(self):
+        if self.kv_store is None:
+            return await self._warm()
+        try:
+            async with self.kv_store.lock("warmer", timeout=self.interval, blocking_timeout=0):
+                return await self._warm()
+        except LockTimeout:
+            logger.info("Cache warm-up is running in another worker, skipping")
+
+    def _budget_left(self, start: float) -> bool:
+        if self.api.breaker.is_open or self.api.quota.exhausted:
+            return False
+        return self.api.quota.spent() - start < self.budget
+
+    async def _warm(self):
+        start = self.api.quota.spent()
+        translator = self.api.translator
+        # Переводы бесплатны - загружаем все
+        await asyncio.gather(*(translator.translate(i) for i in self.ingredients))
+
+        # Пулы дешевле всего: один запрос на диету
+        pools = 0
+        for diet in self.diets:
+            if not self._budget_left(start):
+                break
+            await self.recipe_pool.refill(diet)
+            pools += 1
+
+        warmed = 0
+        for ingredient in self.ingredients:
+            if not self._budget_left(start):
+                break
+            await self.api.search_by_ingredients(ingredient)
+            warmed += 1
+
+        spent = self.api.quota.spent() - start
+        logger.info(
+            f"Cache warm-up: {warmed}/{len(self.ingredients)} ingredients, "
+            f"{pools}/{len(self.diets)} pools, {spent:.2f} quota points spent"
+        )
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import logging
+import secrets
+import signal
+from contextlib import suppress
+from typing import Any, Dict, Optional, Set
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookRequestHandler(SimpleRequestHandler):
+    """Обработчик webhook с проверкой секретного токена.
+
+    Telegram передает ``secret_token`` из ``setWebhook`` в заголовке
+    ``X-Telegram-Bot-Api-Secret-Token``; запросы без него отклоняются.
+    Апдейты обрабатываются в фоне, а при остановке сервера обработчик
+    дожидается уже принятых апдейтов (не дольше ``drain_timeout`` секунд).
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+                 drain_timeout: float = 10, **data: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **data)
+        self.secret_token = secret_token
+        self.drain_timeout = drain_timeout
+        self._tasks: Set[asyncio.Task] = set()
+
+    def verify_secret(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        received = request.headers.get(SECRET_HEADER, "")
+        return secrets.compare_digest(received.encode(), self.secret_token.encode())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request):
+            logger.warning(f"Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=401)
+        return await super().handle(request)
+
+    __call__ = handle
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update: Dict[str, Any] = await request.json(loads=bot.session.json_loads)
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self):
+        """Дожидается принятых апдейтов и закрывает сессию бота"""
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} webhook updates to finish")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await super().close()
+
+
+def build_app(dispatcher: Dispatcher, bot: Bot, secret_token: Optional[str] = None,
+              path: Optional[str] = None) -> web.Application:
+    """Создает aiohttp-приложение, принимающее апдейты на path"""
+    app = web.Application()
+    handler = WebhookRequestHandler(dispatcher, bot, secret_token=secret_token)
+    # Обработчик регистрируется первым: при остановке сначала дожидаемся
+    # апдейтов, потом освобождаем ресурсы в shutdown-хуках диспетчера
+    handler.register(app, path=path or settings.webhook_path)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot):
+    """Запускает бота в режиме webhook до SIGINT/SIGTERM"""
+    if not settings.webhook_url:
+        raise RuntimeError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+    # Без заданного секрета выводим его из токена бота: он одинаков у всех
+    # воркеров за одним webhook и не угадывается без токена
+    secret_token = settings.webhook_secret or hashlib.sha256(
+        f"webhook:{bot.token}".encode()
+    ).hexdigest()
+    app = build_app(dispatcher, bot, secret_token=secret_token)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.webhook_host, settings.webhook_port)
+    await site.start()
+
+    url = settings.webhook_url.rstrip("/") + settings.webhook_path
+    # Накопившиеся апдейты не сбрасываем: при перезапуске одного из
+    # воркеров их обработают остальные
+    await bot.set_webhook(
+        url,
+        secret_token=secret_token,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+    )
+    logger.info(f"Webhook listening on {settings.webhook_host}:{settings.webhook_port}, url {url}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Stopping webhook server")
+        # Перестает принимать соединения, затем вызывает shutdown-хуки
+        await runner.cleanup()
@@ -1,4 +1,5 @@
 from aiogram.fsm.state import StatesGroup, State
 
 class IngredientsState(StatesGroup):
+    choosing_ingredients = State()  # Выбранные ингредиенты - в data['ingredients']
     waiting_for_ingredient = State()
\ No newline at end of file
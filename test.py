@@ -4,8 +4,12 @@ from config.settings import settings
 
 async def main():
     api = SpoonacularAPI(settings.spoonacular_api_key)
-    recipe = await api.get_random_recipe()
-    print("Рецепт:", recipe)
+    await api.start()
+    try:
+        recipe = await api.get_random_recipe()
+        print("Рецепт:", recipe)
+    finally:
+        await api.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file